@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+def check_openai_configured():
+    if not settings.OPENAI_API_KEY:
+        logger.error("OpenAI API key is not configured")
+        raise ImproperlyConfigured('OpenAI API key is not configured')
+
+def _http_options():
+    # OPENAI_MAX_CONNECTIONS caps the concurrent calls of a process; a call
+    # that waits OPENAI_POOL_TIMEOUT for a free connection fails with a timeout
+    return {
+        'limits': httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        'timeout': httpx.Timeout(settings.OPENAI_TIMEOUT, pool=settings.OPENAI_POOL_TIMEOUT),
+    }
+
+def build_openai_client(**http_options):
+    options = _http_options()
+    return OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        timeout=options['timeout'],
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=httpx.Client(**options, **http_options),
+    )
+
+def build_async_openai_client(**http_options):
+    options = _http_options()
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        timeout=options['timeout'],
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=httpx.AsyncClient(**options, **http_options),
+    )
+
+_clients = {}
+# httpx async connections belong to the event loop that opened them
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+def _with_timeout(client, timeout):
+    # A copy that shares the connection pool
+    return client.with_options(timeout=timeout) if timeout is not None else client
+
+def get_openai_client(timeout=None):
+    """
+    The process's shared OpenAI client, keeping connections alive between
+    requests. ``timeout`` overrides OPENAI_TIMEOUT for the calls made with
+    the returned client.
+    """
+    check_openai_configured()
+    # One client per process: a forked worker must not reuse its parent's sockets
+    pid = os.getpid()
+    with _clients_lock:
+        if pid not in _clients:
+            _clients.clear()
+            _clients[pid] = build_openai_client()
+        return _with_timeout(_clients[pid], timeout)
+
+def get_async_openai_client(timeout=None):
+    """
+    The shared AsyncOpenAI client of the running event loop. Must be called
+    from a coroutine on a loop that serves many requests (ASGI); a loop
+    made for one response would leave the client's connections open.
+    """
+    check_openai_configured()
+    loop = asyncio.get_running_loop()
+    pid = os.getpid()
+    with _clients_lock:
+        entry = _async_clients.get(loop)
+        if entry is None or entry[0] != pid:
+            entry = _async_clients[loop] = (pid, build_async_openai_client())
+        return _with_timeout(entry[1], timeout)
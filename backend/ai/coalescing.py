@@ -0,0 +1,57 @@
+import secrets
+import time
+from django.core.cache import cache
+
+class CoalescedFailure(Exception):
+    """The request being waited on failed; carries its error message."""
+
+class CoalescingTimeout(Exception):
+    pass
+
+def single_flight(key, compute, result_timeout, lock_timeout, poll_interval=0.25, failure_timeout=10):
+    """
+    Return ``(result, outcome)`` for ``key``, computing it at most once at a
+    time across every worker sharing the cache. The first caller takes a
+    lock and computes ('computed'); concurrent callers poll for its result
+    ('coalesced'); later callers read the cached result ('cached').
+    ``compute`` must return a picklable, non-None value.
+
+    When the computing caller fails, its error is kept for
+    ``failure_timeout`` seconds and raised to the waiting callers as
+    CoalescedFailure, so they do not each retry the failing call. A caller
+    that dies without releasing the lock holds it for ``lock_timeout``.
+    """
+    lock_key = f"{key}_lock"
+    failure_key = f"{key}_failure"
+    deadline = time.monotonic() + 2 * lock_timeout
+    waited = False
+    while True:
+        result = cache.get(key)
+        if result is not None:
+            return result, 'coalesced' if waited else 'cached'
+        if waited:
+            failure = cache.get(failure_key)
+            if failure is not None:
+                raise CoalescedFailure(failure)
+
+        token = secrets.token_hex(8)
+        if cache.add(lock_key, token, lock_timeout):
+            # An earlier failure must not fail the callers waiting on this attempt
+            cache.delete(failure_key)
+            try:
+                result = compute()
+            except Exception as e:
+                cache.set(failure_key, str(e), failure_timeout)
+                raise
+            else:
+                # Stored before the lock goes, so waiters never see neither
+                cache.set(key, result, result_timeout)
+                return result, 'computed'
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        if time.monotonic() >= deadline:
+            raise CoalescingTimeout(f"Gave up waiting for {key}")
+        waited = True
+        time.sleep(poll_interval)
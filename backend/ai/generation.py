@@ -0,0 +1,66 @@
+import hashlib
+import logging
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from openai import AuthenticationError, OpenAIError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from courses.matching import normalize_answer
+from .clients import get_openai_client
+
+logger = logging.getLogger(__name__)
+
+COURSE_OUTLINE_MAX_TOKENS = 1000
+
+class OpenAIAPIError(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'OpenAI API service is currently unavailable'
+
+def course_outline_cache_key(topic, level):
+    digest = hashlib.sha1(normalize_answer(topic).encode()).hexdigest()
+    return f"course_outline_{level.lower()}_{digest}"
+
+def generate_course_outline(topic, level, user_id, on_progress=None):
+    """
+    Generate a course outline with GPT-4. With ``on_progress`` the
+    completion is streamed and the callback gets the share of the token
+    budget received so far, between 0 and 1.
+    """
+    logger.info(f"Processing course generation request for user {user_id}")
+    client = get_openai_client(timeout=settings.COURSE_GENERATION_TIMEOUT)
+
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4",
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"You are a professional course content creator. Create a detailed course outline for a {level} level course on {topic}."
+                }
+            ],
+            temperature=0.7,
+            max_tokens=COURSE_OUTLINE_MAX_TOKENS,
+            stream=on_progress is not None,
+        )
+        if on_progress is None:
+            content = response.choices[0].message.content
+        else:
+            chunks = []
+            for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    chunks.append(delta)
+                    # Roughly one token per chunk
+                    on_progress(min(len(chunks) / COURSE_OUTLINE_MAX_TOKENS, 1))
+            content = ''.join(chunks)
+    except AuthenticationError as e:
+        logger.error(f"OpenAI API authentication error: {str(e)}")
+        raise ImproperlyConfigured('Invalid OpenAI API key')
+    except OpenAIError as e:
+        logger.error(f"OpenAI API error for user {user_id}: {str(e)}")
+        raise OpenAIAPIError(detail=str(e))
+
+    logger.info(f"Successfully processed course generation request for user {user_id}")
+    return {
+        'content': content
+    }
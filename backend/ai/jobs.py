@@ -0,0 +1,77 @@
+import logging
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils import timezone
+from courses.workers import get_pool
+from .coalescing import CoalescedFailure, CoalescingTimeout, single_flight
+from .generation import OpenAIAPIError, course_outline_cache_key, generate_course_outline
+from .metrics import incr
+from .models import CourseGenerationJob
+
+logger = logging.getLogger(__name__)
+
+# Progress while waiting for the first token, and how far the streamed tokens take it
+STARTED_PROGRESS = 5
+STREAMED_PROGRESS = 90
+PROGRESS_STEP = 5
+
+def enqueue_course_jobs(job_ids, block=False):
+    """
+    Hand jobs to this process's course generation pool. Unless ``block`` is
+    set, raises QueueFull when the pool stays full for
+    COURSE_GENERATION_ENQUEUE_TIMEOUT seconds. Returns the futures.
+    """
+    timeout = None if block else settings.COURSE_GENERATION_ENQUEUE_TIMEOUT
+    pool = get_pool('course_generation', settings.COURSE_GENERATION_WORKERS, settings.COURSE_GENERATION_QUEUE_SIZE)
+    return [pool.submit(_run_course_job, job_id, timeout=timeout) for job_id in job_ids]
+
+def _run_course_job(job_id):
+    # Runs on a course generation pool thread, which has its own database connection
+    try:
+        run_course_job(job_id)
+    except Exception:
+        logger.exception(f"Course generation job {job_id} failed")
+    finally:
+        connection.close()
+
+def run_course_job(job_id):
+    """
+    Generate the outline of a queued job, saving its progress as the
+    completion streams in. Claiming the job is a conditional update, so a
+    job handed out twice still runs once.
+    """
+    jobs = CourseGenerationJob.objects.filter(pk=job_id)
+    if not jobs.filter(status='queued').update(status='running', started_at=timezone.now(), progress=STARTED_PROGRESS):
+        return
+    job = jobs.only('user_id', 'topic', 'level').get()
+
+    saved = [STARTED_PROGRESS]
+    def on_progress(share):
+        progress = STARTED_PROGRESS + int(share * STREAMED_PROGRESS)
+        if progress >= saved[0] + PROGRESS_STEP:
+            saved[0] = progress
+            jobs.update(progress=progress)
+
+    try:
+        result, outcome = single_flight(
+            course_outline_cache_key(job.topic, job.level),
+            lambda: generate_course_outline(job.topic, job.level, job.user_id, on_progress=on_progress),
+            result_timeout=3600,
+            lock_timeout=settings.COURSE_GENERATION_LOCK_TIMEOUT
+        )
+    except Exception as e:
+        incr('failures')
+        if isinstance(e, ImproperlyConfigured):
+            error = 'Service is not properly configured'
+        elif isinstance(e, OpenAIAPIError):
+            error = str(e.detail)
+        elif isinstance(e, (CoalescedFailure, CoalescingTimeout)):
+            error = str(e)
+        else:
+            error = 'An unexpected error occurred'
+        jobs.update(status='failed', error=error, completed_at=timezone.now())
+        raise
+
+    incr({'cached': 'cache_hits', 'computed': 'upstream_calls', 'coalesced': 'coalesced'}[outcome])
+    jobs.update(status='completed', progress=100, result=result, completed_at=timezone.now())
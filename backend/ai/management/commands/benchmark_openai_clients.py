@@ -0,0 +1,114 @@
+import asyncio
+import json
+import ssl
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from ai.clients import build_async_openai_client, build_openai_client
+
+COMPLETION = json.dumps({
+    'id': 'chatcmpl-stub',
+    'object': 'chat.completion',
+    'created': 0,
+    'model': 'stub',
+    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'ok'}, 'finish_reason': 'stop'}],
+}).encode()
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive capable, like the real API
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without this, delayed ACKs add 40ms to reused connections
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+class Command(BaseCommand):
+    help = (
+        'Compare the per-call latency of a fresh OpenAI client per request '
+        'against the shared pooled clients, using a local stub server'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200)
+        parser.add_argument('--certfile', help='Serve the stub over TLS with this certificate')
+        parser.add_argument('--keyfile', help='Private key of --certfile')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        scheme, http_options = 'http', {}
+        if options['certfile']:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(options['certfile'], options['keyfile'])
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+            scheme, http_options = 'https', {'verify': options['certfile']}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"{scheme}://127.0.0.1:{server.server_address[1]}/v1"
+
+        try:
+            with override_settings(OPENAI_API_KEY='sk-benchmark'):
+                results = {
+                    'sync': self.run_sync(base_url, http_options, options['calls']),
+                    'async': asyncio.run(self.run_async(base_url, http_options, options['calls'])),
+                }
+        finally:
+            server.shutdown()
+
+        for variant, (fresh, pooled) in results.items():
+            self.stdout.write(
+                f"{variant}: fresh client {self.summary(fresh)}, pooled client {self.summary(pooled)}, "
+                f"saved {statistics.mean(fresh) - statistics.mean(pooled):.2f}ms per call"
+            )
+
+    def summary(self, latencies):
+        return f"mean {statistics.mean(latencies):.2f}ms p50 {statistics.median(latencies):.2f}ms"
+
+    def call(self, client):
+        return client.chat.completions.create(model='stub', messages=[{'role': 'user', 'content': 'hi'}])
+
+    def run_sync(self, base_url, http_options, calls):
+        fresh = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            client = build_openai_client(**http_options).with_options(base_url=base_url)
+            self.call(client)
+            fresh.append((time.perf_counter() - started) * 1000)
+            client.close()
+
+        pooled = []
+        client = build_openai_client(**http_options).with_options(base_url=base_url)
+        for _ in range(calls):
+            started = time.perf_counter()
+            self.call(client)
+            pooled.append((time.perf_counter() - started) * 1000)
+        client.close()
+        return fresh, pooled
+
+    async def run_async(self, base_url, http_options, calls):
+        fresh = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            client = build_async_openai_client(**http_options).with_options(base_url=base_url)
+            await self.call(client)
+            fresh.append((time.perf_counter() - started) * 1000)
+            await client.close()
+
+        pooled = []
+        client = build_async_openai_client(**http_options).with_options(base_url=base_url)
+        for _ in range(calls):
+            started = time.perf_counter()
+            await self.call(client)
+            pooled.append((time.perf_counter() - started) * 1000)
+        await client.close()
+        return fresh, pooled
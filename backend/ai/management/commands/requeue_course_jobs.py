@@ -0,0 +1,40 @@
+import logging
+import time
+from concurrent.futures import wait
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from ai.jobs import enqueue_course_jobs
+from ai.models import CourseGenerationJob
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run course generation jobs left queued or running by a restarted web worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=int, default=None,
+            help='Seconds after which a queued or running job is considered lost '
+                 '(default: COURSE_GENERATION_LOCK_TIMEOUT)'
+        )
+
+    def handle(self, *args, **options):
+        stale_after = options['stale_after'] or settings.COURSE_GENERATION_LOCK_TIMEOUT
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        stale = CourseGenerationJob.objects.filter(
+            Q(status='queued', created_at__lt=cutoff) | Q(status='running', started_at__lt=cutoff)
+        )
+        job_ids = list(stale.values_list('id', flat=True))
+        # Running jobs are claimed again from 'queued'
+        CourseGenerationJob.objects.filter(pk__in=job_ids).update(status='queued', progress=0, started_at=None)
+
+        started = time.perf_counter()
+        # Block on a full queue instead of dropping jobs
+        futures = enqueue_course_jobs(job_ids, block=True)
+        wait(futures)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Ran {len(futures)} stale course generation jobs in {elapsed:.3f}s")
+        self.stdout.write(self.style.SUCCESS(f'Ran {len(futures)} stale course generation jobs in {elapsed:.3f}s'))
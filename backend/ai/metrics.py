@@ -0,0 +1,70 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Q
+from django.utils import timezone
+from .models import CourseGenerationJob
+
+COURSE_GENERATION_COUNTERS = ['requests', 'cache_hits', 'upstream_calls', 'coalesced', 'failures']
+
+def _key(name):
+    return f"ai_metrics_{name}"
+
+def incr(name, delta=1):
+    # Counters live in the shared cache, so they add up across workers
+    key = _key(name)
+    if cache.add(key, delta, None):
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted between the add and the incr
+        cache.add(key, delta, None)
+
+def get_counters(names):
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name), 0) for name in names}
+
+def course_generation_metrics():
+    """
+    Course generation counters since the cache was last cleared, with the
+    share of generations that reused a concurrent identical request
+    instead of calling the API.
+    """
+    counters = get_counters(COURSE_GENERATION_COUNTERS)
+    generations = counters['upstream_calls'] + counters['coalesced']
+    counters['coalescing_ratio'] = round(counters['coalesced'] / generations, 4) if generations else None
+    return counters
+
+def _duration(end, start):
+    return ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+
+def _seconds(duration):
+    return round(duration.total_seconds(), 3) if duration is not None else None
+
+def course_job_metrics(window=timedelta(hours=1)):
+    """
+    Queue depth of the background course generation jobs, and the queue
+    wait and end-to-end latency of the jobs finished within ``window``.
+    """
+    depth = CourseGenerationJob.objects.filter(status__in=['queued', 'running']).aggregate(
+        queued=Count('pk', filter=Q(status='queued')),
+        running=Count('pk', filter=Q(status='running')),
+    )
+    finished = CourseGenerationJob.objects.filter(
+        completed_at__gte=timezone.now() - window, started_at__isnull=False
+    ).aggregate(
+        completed=Count('pk', filter=Q(status='completed')),
+        failed=Count('pk', filter=Q(status='failed')),
+        wait_avg=Avg(_duration('started_at', 'created_at')),
+        wait_max=Max(_duration('started_at', 'created_at')),
+        latency_avg=Avg(_duration('completed_at', 'created_at')),
+        latency_max=Max(_duration('completed_at', 'created_at')),
+    )
+    return {
+        **depth,
+        'completed': finished['completed'],
+        'failed': finished['failed'],
+        'window_seconds': int(window.total_seconds()),
+        'wait_seconds': {'avg': _seconds(finished['wait_avg']), 'max': _seconds(finished['wait_max'])},
+        'latency_seconds': {'avg': _seconds(finished['latency_avg']), 'max': _seconds(finished['latency_max'])},
+    }
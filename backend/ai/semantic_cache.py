@@ -0,0 +1,141 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from courses.matching import normalize_answer, within_edit_distance
+
+# Words that can differ between two prompts without changing the question
+STOPWORDS = frozenset(
+    'a an the is are was were be been do does did i you we me my your our it its in on of for to with '
+    'about please there this that these those'.split()
+)
+
+# Words that change the question however similar the rest is: question
+# words, modals, conjunctions and negations ('t is what is left of "n't"
+# once punctuation is dropped). Two prompts must use the same ones, in the
+# same order, with no typo allowed.
+KEY_WORDS = frozenset(
+    'how what why when where who whom whose which can could would should will shall must may might '
+    'and or but nor vs versus not no never without nothing none cannot t'.split()
+)
+
+# Details that make a prompt, and so possibly its answer, specific to one person
+PERSONAL_DETAILS = re.compile(r'\S+@\S+|\d{4,}|\+\d')
+
+def is_shareable(message):
+    # Short prompts without contact details, account or card numbers
+    return len(message) <= settings.CHAT_CACHE_MAX_PROMPT_CHARS and not PERSONAL_DETAILS.search(message)
+
+def _content_words(text):
+    return [word for word in text.split() if word not in STOPWORDS and word not in KEY_WORDS]
+
+def _key_words(text):
+    return [word for word in text.split() if word in KEY_WORDS]
+
+def _vector(text):
+    # Content and key word, word bigram and character trigram counts, L2-normalized
+    words = [word for word in text.split() if word not in STOPWORDS] or text.split()
+    features = Counter(f"w:{word}" for word in words)
+    features.update(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+    padded = f" {' '.join(words)} "
+    features.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    norm = math.sqrt(sum(count * count for count in features.values()))
+    return {feature: count / norm for feature, count in features.items()}
+
+def _same_content(first, second):
+    # Every content word of each prompt appears in the other, allowing a typo in longer words
+    def covered(words, others):
+        return all(
+            any(word == other or (len(word) >= 5 and within_edit_distance(word, other, 1)) for other in others)
+            for word in words
+        )
+    return covered(first, second) and covered(second, first)
+
+class SemanticCache:
+    """
+    An in-memory LRU of chat answers looked up by prompt similarity: the
+    cosine of sparse n-gram vectors, found through an inverted index, above
+    ``threshold``, between prompts whose content words agree and whose key
+    words are the same. Entries expire ``ttl`` seconds after they are stored.
+    """
+
+    def __init__(self, capacity, ttl, threshold):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # normalized prompt -> (answer, expires_at, vector)
+        self._postings = {}  # feature -> {normalized prompt: weight}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, message):
+        prompt = normalize_answer(message)
+        with self._lock:
+            key = prompt if prompt in self._entries else self._nearest(prompt)
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, message, answer):
+        prompt = normalize_answer(message)
+        if not prompt:
+            return
+        vector = _vector(prompt)
+        with self._lock:
+            if prompt in self._entries:
+                self._remove(prompt)
+            self._entries[prompt] = (answer, time.monotonic() + self.ttl, vector)
+            for feature, weight in vector.items():
+                self._postings.setdefault(feature, {})[prompt] = weight
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+
+    def _nearest(self, prompt):
+        if not prompt:
+            return None
+        scores = {}
+        for feature, weight in _vector(prompt).items():
+            for key, other_weight in self._postings.get(feature, {}).items():
+                scores[key] = scores.get(key, 0) + weight * other_weight
+        content, key_words = _content_words(prompt), _key_words(prompt)
+        candidates = sorted(
+            ((score, key) for key, score in scores.items() if score >= self.threshold), reverse=True
+        )
+        for _, key in candidates:
+            if _key_words(key) == key_words and _same_content(content, _content_words(key)):
+                return key
+        return None
+
+    def _remove(self, key):
+        _, _, vector = self._entries.pop(key)
+        for feature in vector:
+            postings = self._postings[feature]
+            del postings[key]
+            if not postings:
+                del self._postings[feature]
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_chat_cache():
+    # One cache per process: a forked worker starts empty rather than sharing the parent's lock
+    pid = os.getpid()
+    with _caches_lock:
+        if pid not in _caches:
+            _caches.clear()
+            _caches[pid] = SemanticCache(
+                settings.CHAT_CACHE_CAPACITY,
+                settings.CHAT_CACHE_TTL,
+                settings.CHAT_CACHE_SIMILARITY,
+            )
+        return _caches[pid]
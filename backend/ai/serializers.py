@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from .models import CourseGenerationJob
+
+class CourseGenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CourseGenerationJob
+        fields = [
+            'id', 'topic', 'level', 'status', 'progress', 'result', 'error',
+            'created_at', 'started_at', 'completed_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,74 @@
+import json
+import logging
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from openai import AuthenticationError, OpenAIError
+from .clients import build_async_openai_client, get_async_openai_client
+from .semantic_cache import get_chat_cache
+
+logger = logging.getLogger(__name__)
+
+def sse_event(data, event=None):
+    # One server-sent event; JSON keeps newlines in tokens on a single data line
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def stream_cached(response_data):
+    yield sse_event({'delta': response_data['response']})
+    yield sse_event(response_data, event='done')
+
+async def stream_chat_completion(completion_kwargs, cache_key, user_id, shared_message=None, shared_client=False):
+    """
+    Relay a chat completion as server-sent events: a 'delta' event per
+    token chunk, then a 'done' event with the whole response, which is
+    cached like a non-streamed one, in the shared chat cache when
+    ``shared_message`` is given. Failures end the stream with an 'error'
+    event, since the status line has already been sent.
+
+    ``shared_client`` reuses the pooled client of the running event loop,
+    which only pays off when the loop outlives the response (ASGI). Under
+    WSGI every streamed response runs on a loop of its own, so the client
+    is built for the response and closed with it.
+    """
+    chunks = []
+    client = stream = None
+    try:
+        # Resolved here, on the event loop that iterates the response
+        client = get_async_openai_client() if shared_client else build_async_openai_client()
+        stream = await client.chat.completions.create(**completion_kwargs, stream=True)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                chunks.append(delta)
+                yield sse_event({'delta': delta})
+    except AuthenticationError as e:
+        logger.error(f"OpenAI API authentication error: {str(e)}")
+        yield sse_event({'error': 'Service is not properly configured'}, event='error')
+        return
+    except OpenAIError as e:
+        logger.error(f"OpenAI API error for user {user_id}: {str(e)}")
+        yield sse_event({'error': str(e)}, event='error')
+        return
+    finally:
+        # Hand the connection back to the pool, even on disconnect
+        if stream is not None:
+            await stream.close()
+        if client is not None and not shared_client:
+            await client.close()
+
+    response_data = {'response': ''.join(chunks)}
+    if shared_message is not None:
+        get_chat_cache().set(shared_message, response_data['response'])
+    else:
+        # Cache the response for 5 minutes
+        await cache.aset(cache_key, response_data, 300)
+    logger.info(f"Successfully streamed chat request for user {user_id}")
+    yield sse_event(response_data, event='done')
@@ -0,0 +1,342 @@
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from courses.workers import QueueFull
+from users.models import User
+from . import clients, semantic_cache
+from .clients import build_async_openai_client
+from .coalescing import CoalescedFailure, CoalescingTimeout, single_flight
+from .generation import OpenAIAPIError, course_outline_cache_key
+from .jobs import run_course_job
+from .models import CourseGenerationJob
+from .semantic_cache import SemanticCache
+
+@override_settings(OPENAI_API_KEY='sk-test', OPENAI_MAX_RETRIES=0)
+class ChatStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        semantic_cache._caches.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def fake_async_client(self, tokens):
+        async def chunks():
+            for token in tokens:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+        stream = mock.MagicMock()
+        stream.__aiter__.side_effect = lambda: chunks()
+        stream.close = mock.AsyncMock()
+        client = mock.MagicMock()
+        client.chat.completions.create = mock.AsyncMock(return_value=stream)
+        client.close = mock.AsyncMock()
+        return client
+
+    def test_stream_relays_tokens_then_the_whole_response(self):
+        client = self.fake_async_client(['A closure ', 'keeps ', 'its scope.'])
+        with mock.patch('ai.streaming.build_async_openai_client', return_value=client):
+            response = self.client.post('/api/ai/chat/', {'message': 'What is a closure?', 'stream': True}, format='json')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join(response).decode()
+
+        self.assertEqual(body.split('\n\n')[:4], [
+            'data: {"delta": "A closure "}',
+            'data: {"delta": "keeps "}',
+            'data: {"delta": "its scope."}',
+            'event: done\ndata: {"response": "A closure keeps its scope."}',
+        ])
+        self.assertTrue(client.chat.completions.create.await_args.kwargs['stream'])
+        client.close.assert_awaited_once()
+
+        # The streamed answer is cached like a plain one
+        response = self.client.post('/api/ai/chat/', {'message': 'What is a closure?', 'stream': 'false'}, format='json')
+        self.assertEqual(response.data, {'response': 'A closure keeps its scope.'})
+
+    def test_false_strings_do_not_stream(self):
+        completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='Yes.'))])
+        client = mock.Mock()
+        client.chat.completions.create.return_value = completion
+        with mock.patch('ai.views.get_openai_client', return_value=client):
+            for value in ('false', 'False', '0', 0, False, None):
+                with self.subTest(stream=value):
+                    cache.clear()
+                    semantic_cache._caches.clear()
+                    response = self.client.post('/api/ai/chat/', {'message': 'Is Python free?', 'stream': value}, format='json')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.data, {'response': 'Yes.'})
+        self.assertNotIn('stream', client.chat.completions.create.call_args.kwargs)
+
+    def test_unrecognised_stream_value_is_rejected(self):
+        response = self.client.post('/api/ai/chat/', {'message': 'Is Python free?', 'stream': 'maybe'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_wsgi_stream_closes_its_own_client(self):
+        built = []
+        def build_unreachable_client():
+            client = build_async_openai_client().with_options(base_url='http://127.0.0.1:1/v1')
+            built.append(client)
+            return client
+
+        with mock.patch('ai.streaming.build_async_openai_client', build_unreachable_client):
+            response = self.client.post('/api/ai/chat/', {'message': 'What is a closure?', 'stream': True}, format='json')
+            # Consumed the way the WSGI handler does, on a loop made for this response
+            body = b''.join(response).decode()
+
+        self.assertIn('event: error', body)
+        self.assertEqual(len(built), 1)
+        self.assertTrue(built[0].is_closed())
+        self.assertEqual(len(clients._async_clients), 0)
+
+class SemanticCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SemanticCache(capacity=100, ttl=60, threshold=0.7)
+
+    def test_rephrased_prompts_share_an_answer(self):
+        self.cache.set('How do I install Python?', 'HOW')
+        for prompt in ('how do i install python', 'How do I install the Python?', 'How do I instal Python?'):
+            with self.subTest(prompt=prompt):
+                self.assertEqual(self.cache.get(prompt), 'HOW')
+
+    def test_question_words_and_modals_are_part_of_the_key(self):
+        self.cache.set('How do I install Python?', 'HOW')
+        for prompt in (
+            'Why do I install Python?',
+            'When should I install Python',
+            'Where do I install Python',
+            'Who can install Python',
+            'What do I install Python',
+            'How can I install Python?',
+        ):
+            with self.subTest(prompt=prompt):
+                self.assertIsNone(self.cache.get(prompt))
+
+    def test_conjunctions_and_negations_are_part_of_the_key(self):
+        self.cache.set('What is the difference between a list and tuple?', 'AND')
+        self.cache.set('Should I use Django with Celery?', 'WITH')
+        for prompt in (
+            'What is the difference between a list or tuple?',
+            'Should I use Django without Celery?',
+            "Shouldn't I use Django with Celery?",
+            'Should I not use Django with Celery?',
+        ):
+            with self.subTest(prompt=prompt):
+                self.assertIsNone(self.cache.get(prompt))
+        self.assertEqual(self.cache.get('what is the difference between list and tuple'), 'AND')
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def run_concurrently(self, compute, callers):
+        # The first caller takes the lock inside compute, the rest start once it is held
+        outcomes = []
+        def call():
+            try:
+                outcomes.append(single_flight('outline', compute, result_timeout=60, lock_timeout=5, poll_interval=0.01))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        threads[0].start()
+        self.assertTrue(self.computing.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        # Long enough for every waiter to find the lock taken
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def blocking(self, result=None, error=None):
+        self.computing, self.release = threading.Event(), threading.Event()
+        calls = []
+        def compute():
+            calls.append(1)
+            self.computing.set()
+            self.release.wait(5)
+            if error:
+                raise error
+            return result
+        return compute, calls
+
+    def test_concurrent_callers_share_one_computation(self):
+        compute, calls = self.blocking(result={'content': 'Outline'})
+        outcomes = self.run_concurrently(compute, 5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(outcome for _, outcome in outcomes), ['coalesced'] * 4 + ['computed'])
+        self.assertTrue(all(result == {'content': 'Outline'} for result, _ in outcomes))
+        self.assertEqual(single_flight('outline', compute, 60, 5), ({'content': 'Outline'}, 'cached'))
+        self.assertEqual(len(calls), 1)
+
+    def test_waiters_get_the_failure_instead_of_retrying(self):
+        compute, calls = self.blocking(error=RuntimeError('Upstream is down'))
+        outcomes = self.run_concurrently(compute, 3)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(isinstance(e, RuntimeError) for e in outcomes), 1)
+        failures = [e for e in outcomes if isinstance(e, CoalescedFailure)]
+        self.assertEqual([str(e) for e in failures], ['Upstream is down'] * 2)
+
+        # The lock went with the failure, so the next caller tries again
+        self.assertEqual(single_flight('outline', lambda: 'Outline', 60, 5), ('Outline', 'computed'))
+
+    def test_gives_up_on_a_lock_that_is_never_released(self):
+        cache.set('outline_lock', 'dead worker', 60)
+        compute = mock.Mock()
+        with self.assertRaises(CoalescingTimeout):
+            single_flight('outline', compute, result_timeout=60, lock_timeout=0.05, poll_interval=0.01)
+        compute.assert_not_called()
+
+class GenerateCourseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructors = [
+            User.objects.create_user(f'instructor{i}', f'instructor{i}@example.com', 'password', user_type='instructor')
+            for i in range(2)
+        ]
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, user, topic, level='beginner'):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/api/ai/generate-course/', {'topic': topic, 'level': level}, format='json')
+
+    @mock.patch('ai.views.generate_course_outline', return_value={'content': 'Outline'})
+    def test_identical_requests_share_a_result_across_users(self, generate):
+        self.assertEqual(self.post(self.instructors[0], 'Django REST').data, {'content': 'Outline'})
+        self.assertEqual(self.post(self.instructors[1], '  django rest ').data, {'content': 'Outline'})
+        self.assertEqual(generate.call_count, 1)
+
+        self.post(self.instructors[1], 'Django REST', level='advanced')
+        self.assertEqual(generate.call_count, 2)
+
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        metrics = client.get('/api/ai/metrics/').data['course_generation']
+        self.assertEqual(
+            {name: metrics[name] for name in ('requests', 'cache_hits', 'upstream_calls', 'coalesced', 'failures')},
+            {'requests': 3, 'cache_hits': 1, 'upstream_calls': 2, 'coalesced': 0, 'failures': 0}
+        )
+        self.assertEqual(metrics['coalescing_ratio'], 0)
+
+@override_settings(OPENAI_API_KEY='sk-test')
+class CourseGenerationJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', 'instructor@example.com', 'password', user_type='instructor')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'password', user_type='instructor')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def submit(self, topic='Django REST', level='beginner'):
+        return self.client.post('/api/ai/course-jobs/', {'topic': topic, 'level': level}, format='json')
+
+    @mock.patch('ai.views.enqueue_course_jobs')
+    def test_submit_queues_the_job_and_points_at_it(self, enqueue):
+        response = self.submit()
+
+        self.assertEqual(response.status_code, 202)
+        job = CourseGenerationJob.objects.get()
+        self.assertEqual((job.status, job.progress, job.user), ('queued', 0, self.instructor))
+        enqueue.assert_called_once_with([job.id])
+        self.assertEqual(response['Location'], f'/api/ai/course-jobs/{job.id}/')
+
+        self.assertEqual(self.client.get(response['Location']).data['status'], 'queued')
+        other = APIClient()
+        other.force_authenticate(self.other)
+        self.assertEqual(other.get(response['Location']).status_code, 404)
+
+    @mock.patch('ai.views.enqueue_course_jobs')
+    def test_cached_outline_completes_at_once(self, enqueue):
+        cache.set(course_outline_cache_key('Django REST', 'beginner'), {'content': 'Outline'})
+        response = self.submit(topic='django rest')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            (response.data['status'], response.data['progress'], response.data['result']),
+            ('completed', 100, {'content': 'Outline'})
+        )
+        enqueue.assert_not_called()
+
+    @mock.patch('ai.views.enqueue_course_jobs', side_effect=QueueFull)
+    def test_full_queue_fails_the_job(self, enqueue):
+        response = self.submit()
+
+        self.assertEqual(response.status_code, 503)
+        job = CourseGenerationJob.objects.get()
+        self.assertEqual((job.status, job.error), ('failed', 'Course generation is busy'))
+
+    def test_job_saves_progress_then_the_result(self):
+        job = CourseGenerationJob.objects.create(user=self.instructor, topic='Django REST', level='beginner')
+        seen = []
+        def generate(topic, level, user_id, on_progress):
+            seen.append(CourseGenerationJob.objects.get(pk=job.pk).status)
+            for share in (0.01, 0.1, 0.12, 0.5, 1):
+                on_progress(share)
+                seen.append(CourseGenerationJob.objects.get(pk=job.pk).progress)
+            return {'content': f'{topic} for {level}'}
+
+        with mock.patch('ai.jobs.generate_course_outline', side_effect=generate):
+            run_course_job(job.id)
+
+        # Saved in steps of at least five percent
+        self.assertEqual(seen, ['running', 5, 14, 14, 50, 95])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.result), ('completed', 100, {'content': 'Django REST for beginner'}))
+        self.assertLessEqual(job.created_at, job.started_at)
+        self.assertLessEqual(job.started_at, job.completed_at)
+
+    def test_failed_generation_fails_the_job(self):
+        job = CourseGenerationJob.objects.create(user=self.instructor, topic='Django REST', level='beginner')
+        with mock.patch('ai.jobs.generate_course_outline', side_effect=OpenAIAPIError(detail='Rate limited')):
+            with self.assertRaises(OpenAIAPIError):
+                run_course_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.result), ('failed', 'Rate limited', None))
+        self.assertIsNotNone(job.completed_at)
+
+    def test_job_handed_out_twice_runs_once(self):
+        job = CourseGenerationJob.objects.create(user=self.instructor, topic='Django REST', level='beginner')
+        with mock.patch('ai.jobs.generate_course_outline', return_value={'content': 'Outline'}) as generate:
+            run_course_job(job.id)
+            run_course_job(job.id)
+        self.assertEqual(generate.call_count, 1)
+
+    @mock.patch('ai.management.commands.requeue_course_jobs.enqueue_course_jobs', return_value=[])
+    def test_requeue_recovers_only_stale_jobs(self, enqueue):
+        long_ago = timezone.now() - timedelta(hours=1)
+        stale = CourseGenerationJob.objects.create(user=self.instructor, topic='Stale', level='beginner')
+        CourseGenerationJob.objects.filter(pk=stale.pk).update(
+            status='running', progress=40, created_at=long_ago, started_at=long_ago
+        )
+        fresh = CourseGenerationJob.objects.create(
+            user=self.instructor, topic='Fresh', level='beginner', status='running', progress=40, started_at=timezone.now()
+        )
+
+        call_command('requeue_course_jobs', stdout=mock.Mock())
+
+        enqueue.assert_called_once_with([stale.id], block=True)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.progress, stale.started_at), ('queued', 0, None))
+        self.assertEqual((fresh.status, fresh.progress), ('running', 40))
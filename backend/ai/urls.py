@@ -1,7 +1,16 @@
 from django.urls import path
-from .views import ChatView, GenerateCourseView
+from .views import (
+    AIMetricsView,
+    ChatView,
+    CourseGenerationJobDetailView,
+    CourseGenerationJobView,
+    GenerateCourseView
+)
 
 urlpatterns = [
     path('chat/', ChatView.as_view(), name='ai-chat'),
     path('generate-course/', GenerateCourseView.as_view(), name='generate-course'),
+    path('course-jobs/', CourseGenerationJobView.as_view(), name='course-generation-jobs'),
+    path('course-jobs/<int:pk>/', CourseGenerationJobDetailView.as_view(), name='course-generation-job'),
+    path('metrics/', AIMetricsView.as_view(), name='ai-metrics'),
 ] 
\ No newline at end of file
@@ -1,19 +1,32 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import generics, serializers, status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.throttling import UserRateThrottle
 from rest_framework.parsers import JSONParser
 from rest_framework.exceptions import ValidationError, APIException
-from openai import OpenAI, OpenAIError, AuthenticationError
+from openai import OpenAIError, AuthenticationError
 import os
 import logging
 from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_cookie
+from courses.workers import QueueFull
+from .clients import check_openai_configured, get_openai_client
+from .generation import OpenAIAPIError, course_outline_cache_key, generate_course_outline
+from .coalescing import CoalescedFailure, CoalescingTimeout, single_flight
+from .jobs import enqueue_course_jobs
+from .metrics import course_generation_metrics, course_job_metrics, incr
+from .models import CourseGenerationJob
+from .serializers import CourseGenerationJobSerializer
+from .semantic_cache import get_chat_cache, is_shareable
+from .streaming import event_stream_response, stream_cached, stream_chat_completion
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,15 +37,29 @@ class ChatRateThrottle(UserRateThrottle):
 class CourseRateThrottle(UserRateThrottle):
     rate = '3/hour'
 
-class OpenAIAPIError(APIException):
-    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-    default_detail = 'OpenAI API service is currently unavailable'
-
-def get_openai_client():
-    if not settings.OPENAI_API_KEY:
-        logger.error("OpenAI API key is not configured")
-        raise ImproperlyConfigured('OpenAI API key is not configured')
-    return OpenAI(api_key=settings.OPENAI_API_KEY)
+def chat_completion_kwargs(message):
+    return {
+        'model': 'gpt-3.5-turbo',
+        'messages': [
+            {
+                'role': 'system',
+                'content': '''You are an AI assistant for Shams Academy Inventors School. 
+                You can help users with:
+                1. Course selection and recommendations
+                2. Programming questions and explanations
+                3. Payment and subscription information
+                4. General questions about the platform
+                
+                Be friendly, professional, and concise in your responses.'''
+            },
+            {
+                'role': 'user',
+                'content': message,
+            },
+        ],
+        'temperature': 0.7,
+        'max_tokens': 150,
+    }
 
 class ChatView(APIView):
     permission_classes = [IsAuthenticated]
@@ -49,40 +76,42 @@ class ChatView(APIView):
                     {'error': 'Message is required'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            # "false" and "0" are as falsy here as in a query string
+            stream = serializers.BooleanField().to_internal_value(request.data.get('stream') or False)
 
-            # Check if we have a cached response
+            # Check if we have a cached response: answers to non-personal
+            # prompts are shared between users and matched by similarity
             cache_key = f"chat_{request.user.id}_{message}"
-            cached_response = cache.get(cache_key)
+            shared = is_shareable(message)
+            if shared:
+                answer = get_chat_cache().get(message)
+                cached_response = {'response': answer} if answer is not None else None
+            else:
+                cached_response = cache.get(cache_key)
             if cached_response:
                 logger.info(f"Cache hit for user {request.user.id}")
+                if stream:
+                    return event_stream_response(stream_cached(cached_response))
                 return Response(cached_response)
 
+            if stream:
+                # Relayed from the event loop under ASGI, so no worker thread
+                # waits on the completion
+                logger.info(f"Streaming chat request for user {request.user.id}")
+                check_openai_configured()
+                return event_stream_response(stream_chat_completion(
+                    chat_completion_kwargs(message),
+                    cache_key,
+                    request.user.id,
+                    shared_message=message if shared else None,
+                    shared_client=isinstance(request._request, ASGIRequest)
+                ))
+
             logger.info(f"Processing chat request for user {request.user.id}")
             client = get_openai_client()
             
             try:
-                completion = client.chat.completions.create(
-                    model='gpt-3.5-turbo',
-                    messages=[
-                        {
-                            'role': 'system',
-                            'content': '''You are an AI assistant for Shams Academy Inventors School. 
-                            You can help users with:
-                            1. Course selection and recommendations
-                            2. Programming questions and explanations
-                            3. Payment and subscription information
-                            4. General questions about the platform
-                            
-                            Be friendly, professional, and concise in your responses.'''
-                        },
-                        {
-                            'role': 'user',
-                            'content': message,
-                        },
-                    ],
-                    temperature=0.7,
-                    max_tokens=150,
-                )
+                completion = client.chat.completions.create(**chat_completion_kwargs(message))
             except AuthenticationError as e:
                 logger.error(f"OpenAI API authentication error: {str(e)}")
                 raise ImproperlyConfigured('Invalid OpenAI API key')
@@ -94,8 +123,11 @@ class ChatView(APIView):
                 'response': completion.choices[0].message.content
             }
             
-            # Cache the response for 5 minutes
-            cache.set(cache_key, response_data, 300)
+            if shared:
+                get_chat_cache().set(message, response_data['response'])
+            else:
+                # Cache the response for 5 minutes
+                cache.set(cache_key, response_data, 300)
             logger.info(f"Successfully processed chat request for user {request.user.id}")
             
             return Response(response_data)
@@ -125,6 +157,25 @@ class ChatView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+def parse_course_request(request):
+    # (topic, level, error message)
+    topic = str(request.data.get('topic', '')).strip()
+    level = str(request.data.get('level', '')).strip()
+
+    if not topic or not level:
+        logger.warning(f"Missing required fields from user {request.user.id}")
+        return topic, level, 'Topic and level are required'
+
+    # Validate level
+    valid_levels = ['beginner', 'intermediate', 'advanced']
+    if level.lower() not in valid_levels:
+        logger.warning(f"Invalid level '{level}' from user {request.user.id}")
+        return topic, level, f'Level must be one of: {", ".join(valid_levels)}'
+
+    if len(topic) > CourseGenerationJob._meta.get_field('topic').max_length:
+        return topic, level, 'Topic is too long'
+    return topic, level, None
+
 class GenerateCourseView(APIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [CourseRateThrottle]
@@ -132,62 +183,30 @@ class GenerateCourseView(APIView):
     
     def post(self, request):
         try:
-            topic = request.data.get('topic', '').strip()
-            level = request.data.get('level', '').strip()
-            
-            if not topic or not level:
-                logger.warning(f"Missing required fields from user {request.user.id}")
-                return Response(
-                    {'error': 'Topic and level are required'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Validate level
-            valid_levels = ['beginner', 'intermediate', 'advanced']
-            if level.lower() not in valid_levels:
-                logger.warning(f"Invalid level '{level}' from user {request.user.id}")
-                return Response(
-                    {'error': f'Level must be one of: {", ".join(valid_levels)}'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            topic, level, error = parse_course_request(request)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Check if we have a cached response
-            cache_key = f"course_{request.user.id}_{topic}_{level}"
-            cached_response = cache.get(cache_key)
-            if cached_response:
-                logger.info(f"Cache hit for user {request.user.id}")
-                return Response(cached_response)
-
-            logger.info(f"Processing course generation request for user {request.user.id}")
-            client = get_openai_client()
-            
+            # Identical topic and level requests share one generation, across
+            # users and workers: concurrent ones wait for it instead of calling
+            # the API themselves
+            incr('requests')
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": f"You are a professional course content creator. Create a detailed course outline for a {level} level course on {topic}."
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=1000,
+                response_data, outcome = single_flight(
+                    course_outline_cache_key(topic, level),
+                    lambda: generate_course_outline(topic, level, request.user.id),
+                    result_timeout=3600,
+                    lock_timeout=settings.COURSE_GENERATION_LOCK_TIMEOUT
                 )
-            except AuthenticationError as e:
-                logger.error(f"OpenAI API authentication error: {str(e)}")
-                raise ImproperlyConfigured('Invalid OpenAI API key')
-            except OpenAIError as e:
-                logger.error(f"OpenAI API error for user {request.user.id}: {str(e)}")
+            except (CoalescedFailure, CoalescingTimeout) as e:
+                incr('failures')
                 raise OpenAIAPIError(detail=str(e))
+            except Exception:
+                incr('failures')
+                raise
+            incr({'cached': 'cache_hits', 'computed': 'upstream_calls', 'coalesced': 'coalesced'}[outcome])
+            logger.info(f"Course outline for user {request.user.id}: {outcome}")
 
-            response_data = {
-                'content': response.choices[0].message.content
-            }
-            
-            # Cache the response for 1 hour
-            cache.set(cache_key, response_data, 3600)
-            logger.info(f"Successfully processed course generation request for user {request.user.id}")
-            
             return Response(response_data)
             
         except OpenAIAPIError as e:
@@ -213,4 +232,69 @@ class GenerateCourseView(APIView):
             return Response(
                 {'error': 'An unexpected error occurred'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            ) 
\ No newline at end of file
+            )
+
+class CourseGenerationJobView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [CourseRateThrottle]
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        # Returns at once; the outline is generated on the background pool
+        topic, level, error = parse_course_request(request)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            check_openai_configured()
+        except ImproperlyConfigured:
+            return Response(
+                {'error': 'Service is not properly configured'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        incr('requests')
+        cached_response = cache.get(course_outline_cache_key(topic, level))
+        if cached_response is not None:
+            incr('cache_hits')
+            now = timezone.now()
+            job = CourseGenerationJob.objects.create(
+                user=request.user, topic=topic, level=level, status='completed', progress=100,
+                result=cached_response, started_at=now, completed_at=now
+            )
+            return Response(CourseGenerationJobSerializer(job).data, status=status.HTTP_201_CREATED)
+
+        job = CourseGenerationJob.objects.create(user=request.user, topic=topic, level=level)
+        try:
+            enqueue_course_jobs([job.id])
+        except QueueFull:
+            logger.warning(f"Course generation queue is full, rejected job {job.id}")
+            incr('failures')
+            CourseGenerationJob.objects.filter(pk=job.pk).update(
+                status='failed', error='Course generation is busy', completed_at=timezone.now()
+            )
+            return Response(
+                {'error': 'Course generation is busy, please try again later'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        logger.info(f"Queued course generation job {job.id} for user {request.user.id}")
+        response = Response(CourseGenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('course-generation-job', args=[job.id])
+        return response
+
+class CourseGenerationJobDetailView(generics.RetrieveAPIView):
+    serializer_class = CourseGenerationJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return CourseGenerationJob.objects.filter(user=self.request.user)
+
+class AIMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'course_generation': course_generation_metrics(),
+            'course_generation_jobs': course_job_metrics(),
+        })
+
@@ -0,0 +1,113 @@
+import math
+from django.db import connection
+from django.db.models import Count, F, Q, Sum
+from .models import Choice, ChoiceAttempt, ChoiceStats, Question, QuestionAttempt, QuestionStats, TestAttempt
+
+def _add_to_rollup(model, queryset):
+    """
+    Add the per-key sums selected by ``queryset`` (a values().annotate()
+    aggregation) onto ``model``'s rows with one INSERT ... SELECT ... ON
+    CONFLICT statement, creating the rows that do not exist yet. Rows are
+    upserted in key order, so concurrent rollups lock the rows they share in
+    the same order and wait on each other instead of deadlocking.
+    """
+    names = [*queryset.query.values_select, *queryset.query.annotation_select]
+    quote = connection.ops.quote_name
+    key, *counters = [quote(model._meta.get_field(name).column) for name in names]
+    table = quote(model._meta.db_table)
+    # By the column itself: ordering by a foreign key would follow the related model's ordering
+    order = queryset.model._meta.get_field(names[0]).attname
+    select_sql, params = queryset.order_by(order).query.sql_with_params()
+    updates = ', '.join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in counters)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({key}, {', '.join(counters)}) {select_sql} "
+            f"ON CONFLICT ({key}) DO UPDATE SET {updates}",
+            params
+        )
+
+def record_item_stats(attempt_filter):
+    """
+    Fold finished, fully graded attempts into the question and choice
+    rollups: two set-based statements whatever the number of attempts.
+    ``attempt_filter`` is a Q on TestAttempt; every attempt it matches must
+    be recorded exactly once.
+    """
+    score = F('test_attempt__score')
+    _add_to_rollup(QuestionStats, QuestionAttempt.objects.filter(
+        test_attempt__in=_attempts(attempt_filter)
+    ).values('question').annotate(
+        attempts=Count('pk'),
+        correct=Count('pk', filter=Q(is_correct=True)),
+        score_sum=Sum(score),
+        correct_score_sum=Sum(score, filter=Q(is_correct=True), default=0),
+        score_square_sum=Sum(score * score),
+    ))
+    _add_to_rollup(ChoiceStats, ChoiceAttempt.objects.filter(
+        question_attempt__test_attempt__in=_attempts(attempt_filter), is_selected=True
+    ).values('choice').annotate(selections=Count('pk')))
+
+def _attempts(attempt_filter):
+    return TestAttempt.objects.filter(attempt_filter).values('pk')
+
+def rebuild_item_stats():
+    # Recomputed from every finished attempt in two aggregate statements
+    QuestionStats.objects.all().delete()
+    ChoiceStats.objects.all().delete()
+    record_item_stats(Q(status__in=['completed', 'timeout'], score__isnull=False) & ~Q(
+        question_attempts__grading_pending=True
+    ))
+
+def _discrimination(stats):
+    # Point-biserial correlation between answering correctly and the attempt score
+    attempts, correct = stats['attempts'], stats['correct']
+    if not attempts or correct in (0, attempts):
+        return None
+    mean = stats['score_sum'] / attempts
+    variance = stats['score_square_sum'] / attempts - mean * mean
+    if variance <= 0:
+        return None
+    correct_mean = stats['correct_score_sum'] / correct
+    incorrect_mean = (stats['score_sum'] - stats['correct_score_sum']) / (attempts - correct)
+    p = correct / attempts
+    return round((correct_mean - incorrect_mean) / math.sqrt(variance) * math.sqrt(p * (1 - p)), 4)
+
+def get_test_analytics(test_id):
+    """
+    Difficulty, discrimination and choice distribution of each question of
+    a test, read from the rollups only: two queries however many attempts.
+    """
+    fields = ['attempts', 'correct', 'score_sum', 'correct_score_sum', 'score_square_sum']
+    choices = {}
+    for choice in Choice.objects.filter(question__test_id=test_id).values(
+        'id', 'question_id', 'text', 'is_correct', 'stats__selections'
+    ).order_by('question_id', 'order', 'id'):
+        choices.setdefault(choice['question_id'], []).append(choice)
+
+    questions = []
+    for row in Question.objects.filter(test_id=test_id).values(
+        'id', 'text', 'question_type', 'points', *(f'stats__{field}' for field in fields)
+    ):
+        stats = {field: row[f'stats__{field}'] or 0 for field in fields}
+        question_choices = choices.get(row['id'], [])
+        selections = sum(choice['stats__selections'] or 0 for choice in question_choices)
+        questions.append({
+            'id': row['id'],
+            'text': row['text'],
+            'question_type': row['question_type'],
+            'points': row['points'],
+            'attempts': stats['attempts'],
+            'difficulty': round(stats['correct'] / stats['attempts'], 4) if stats['attempts'] else None,
+            'discrimination': _discrimination(stats),
+            'choices': [
+                {
+                    'id': choice['id'],
+                    'text': choice['text'],
+                    'is_correct': choice['is_correct'],
+                    'selections': choice['stats__selections'] or 0,
+                    'share': round((choice['stats__selections'] or 0) / selections, 4) if selections else None,
+                }
+                for choice in question_choices
+            ],
+        })
+    return questions
@@ -0,0 +1,100 @@
+import logging
+import pickle
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from .cache import get_version, test_version_key
+from .matching import compile_accepted_answers
+from .models import Choice, Question
+
+logger = logging.getLogger(__name__)
+
+# Part of the cache key and of the pickled state: bump it whenever the state
+# changes. A key pickled by another layout is compiled again rather than read.
+ANSWER_KEY_FORMAT = 3
+
+class AnswerKey:
+    """
+    Everything needed to grade one test: for each question its type, its
+    points and the frozenset of correct choice ids, plus the frozenset of
+    all its choice ids for validating submitted answers and the compiled
+    accepted answers of text questions.
+    """
+    __slots__ = ('test_id', 'questions', 'choice_ids', 'text_answers', 'total_points')
+
+    def __init__(self, test_id, questions, choice_ids, text_answers):
+        self.test_id = test_id
+        self.questions = questions
+        self.choice_ids = choice_ids
+        self.text_answers = text_answers
+        self.total_points = sum(points for _, points, _ in questions.values())
+
+    def __getstate__(self):
+        return ANSWER_KEY_FORMAT, self.test_id, self.questions, self.choice_ids, self.text_answers
+
+    def __setstate__(self, state):
+        if state[0] != ANSWER_KEY_FORMAT or len(state) != 5:
+            raise ValueError(f"Answer key pickled with format {state[0]!r}")
+        self.__init__(*state[1:])
+
+    def get(self, question_id):
+        return self.questions.get(question_id)
+
+def compile_answer_keys(test_ids):
+    # Two queries however many tests and questions are involved
+    correct = defaultdict(set)
+    choices = defaultdict(set)
+    for question_id, choice_id, is_correct in Choice.objects.filter(
+        question__test_id__in=test_ids
+    ).values_list('question_id', 'id', 'is_correct'):
+        choices[question_id].add(choice_id)
+        if is_correct:
+            correct[question_id].add(choice_id)
+
+    questions = {test_id: {} for test_id in test_ids}
+    choice_ids = {test_id: {} for test_id in test_ids}
+    text_answers = {test_id: {} for test_id in test_ids}
+    rows = Question.objects.filter(test_id__in=test_ids).values_list(
+        'id', 'test_id', 'question_type', 'points', 'accepted_answers', 'max_edit_distance'
+    )
+    for question_id, test_id, question_type, points, accepted_answers, max_edit_distance in rows:
+        questions[test_id][question_id] = (question_type, points, frozenset(correct[question_id]))
+        choice_ids[test_id][question_id] = frozenset(choices[question_id])
+        if question_type == 'text':
+            accepted = compile_accepted_answers(accepted_answers or [], max_edit_distance)
+            if accepted is not None:
+                text_answers[test_id][question_id] = accepted
+    return {
+        test_id: AnswerKey(test_id, questions[test_id], choice_ids[test_id], text_answers[test_id])
+        for test_id in test_ids
+    }
+
+def answer_key_cache_key(test_id):
+    return f"answer_key_{ANSWER_KEY_FORMAT}_{test_id}_{get_version(test_version_key(test_id))}"
+
+def get_answer_keys(test_ids):
+    """
+    {test_id: AnswerKey}, read from the cache and compiled for the misses.
+    Keys are versioned, so an edited question or choice is never graded
+    against a stale key.
+    """
+    cache_keys = {answer_key_cache_key(test_id): test_id for test_id in set(test_ids)}
+    try:
+        cached = cache.get_many(cache_keys)
+    except (AttributeError, TypeError, ValueError, pickle.UnpicklingError) as e:
+        logger.warning(f"Discarding unreadable cached answer keys for tests {sorted(cache_keys.values())}: {e}")
+        cached = {}
+    answer_keys = {cache_keys[key]: answer_key for key, answer_key in cached.items()}
+
+    missing = {test_id: key for key, test_id in cache_keys.items() if key not in cached}
+    if missing:
+        compiled = compile_answer_keys(list(missing))
+        answer_keys.update(compiled)
+        cache.set_many(
+            {missing[test_id]: answer_key for test_id, answer_key in compiled.items()},
+            settings.ANSWER_KEY_CACHE_TIMEOUT
+        )
+    return answer_keys
+
+def get_answer_key(test_id):
+    return get_answer_keys([test_id])[test_id]
@@ -0,0 +1,120 @@
+from collections import defaultdict
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .answer_keys import get_answer_key
+from .expiry import attempt_expired
+from .grading import CHOICE_TYPES, grade_attempts
+from .models import ChoiceAttempt, QuestionAttempt, TestAttempt
+
+TEXT_FIELDS = ['answer_text', 'code_submission']
+TIME_UP = 'The time limit for this attempt has run out'
+
+def _check_answer(answer_key, answer):
+    entry = answer_key.get(answer['question'])
+    if entry is None:
+        # Deleted or moved to another test after the attempt started
+        raise ValidationError({'answers': f"Question {answer['question']} is no longer part of this test"})
+    question_type, _, _ = entry
+    choices = answer.get('choices')
+    if choices is None:
+        return
+    if question_type not in CHOICE_TYPES:
+        raise ValidationError({'answers': f"Question {answer['question']} does not take choices"})
+    unknown = set(choices) - answer_key.choice_ids[answer['question']]
+    if unknown:
+        raise ValidationError({'answers': f"Unknown choices for question {answer['question']}: {sorted(unknown)}"})
+    if question_type == 'single_choice' and len(set(choices)) > 1:
+        raise ValidationError({'answers': f"Question {answer['question']} takes a single choice"})
+
+def save_answers(attempt_id, answers):
+    """
+    Apply a batch of autosaved answers to an in-progress attempt. Each answer
+    carries a client sequence number per question; an answer whose sequence
+    is not newer than the last one applied is a stale, out-of-order save and
+    is skipped. Runs in one transaction with a fixed number of statements.
+    Returns the question ids that were saved and the ones skipped as stale.
+    Past the time limit plus TEST_TIMEOUT_GRACE_SECONDS nothing is saved: the
+    attempt is graded as it stands and timed out.
+    """
+    with transaction.atomic():
+        # Serializes saves and submit for the same attempt only
+        attempt = TestAttempt.objects.select_for_update(of=('self',)).select_related('test').only(
+            'id', 'test_id', 'status', 'started_at', 'test__time_limit'
+        ).get(pk=attempt_id)
+        if attempt.status != 'in_progress':
+            raise ValidationError({'error': 'This attempt is not in progress'})
+        timed_out = attempt_expired(attempt)
+        if timed_out:
+            grade_attempts([attempt], final_status='timeout')
+        else:
+            result = _apply_answers(attempt, answers)
+    # Raised once the timeout has committed
+    if timed_out:
+        raise ValidationError({'error': TIME_UP, 'status': 'timeout'})
+    return result
+
+def _apply_answers(attempt, answers):
+    answer_key = get_answer_key(attempt.test_id)
+    question_attempts = {
+        question_id: (question_attempt_id, sequence)
+        for question_attempt_id, question_id, sequence in QuestionAttempt.objects.filter(
+            test_attempt_id=attempt.pk
+        ).values_list('id', 'question_id', 'answer_sequence')
+    }
+    unknown = {answer['question'] for answer in answers} - set(question_attempts)
+    if unknown:
+        raise ValidationError({'answers': f"Unknown questions for this attempt: {sorted(unknown)}"})
+
+    saved, stale = [], []
+    for answer in answers:
+        if answer['sequence'] <= question_attempts[answer['question']][1]:
+            stale.append(answer['question'])
+            continue
+        _check_answer(answer_key, answer)
+        saved.append(answer)
+
+    # Fields an answer leaves out keep their stored value, so answers are
+    # upserted in groups that set the same fields
+    groups = defaultdict(list)
+    for answer in saved:
+        groups[tuple(field for field in TEXT_FIELDS if field in answer)].append(answer)
+    for fields, group in groups.items():
+        QuestionAttempt.objects.bulk_create(
+            [
+                QuestionAttempt(
+                    id=question_attempts[answer['question']][0],
+                    test_attempt_id=attempt.pk,
+                    question_id=answer['question'],
+                    answer_sequence=answer['sequence'],
+                    **{field: answer[field] for field in fields}
+                )
+                for answer in group
+            ],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=['answer_sequence', *fields],
+        )
+
+    # A choice answer replaces the whole selection for its question
+    choice_answers = [answer for answer in saved if 'choices' in answer]
+    if choice_answers:
+        ChoiceAttempt.objects.filter(
+            question_attempt_id__in=[question_attempts[answer['question']][0] for answer in choice_answers],
+            is_selected=True
+        ).update(is_selected=False)
+        ChoiceAttempt.objects.bulk_create(
+            [
+                ChoiceAttempt(
+                    question_attempt_id=question_attempts[answer['question']][0],
+                    choice_id=choice_id,
+                    is_selected=True
+                )
+                for answer in choice_answers
+                for choice_id in set(answer['choices'])
+            ],
+            update_conflicts=True,
+            unique_fields=['question_attempt', 'choice'],
+            update_fields=['is_selected'],
+        )
+
+    return {'saved': [answer['question'] for answer in saved], 'stale': stale}
@@ -0,0 +1,117 @@
+import hashlib
+import time
+from array import array
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
+from .models import Enrollment
+
+CATALOG_VERSION_KEY = 'catalog_version'
+POPULARITY_VERSION_KEY = 'popularity_version'
+# Part of the catalog cache keys: bump it whenever the cached representation changes
+CATALOG_PAYLOAD_FORMAT = 2
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted key never comes back as an old version
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+def bump_version(key):
+    cache.set(key, time.time_ns(), None)
+
+def course_version_key(course_id):
+    return f"course_version_{course_id}"
+
+def bump_course_version(course_id):
+    if course_id is not None:
+        bump_version(course_version_key(course_id))
+    bump_version(CATALOG_VERSION_KEY)
+
+def bump_enrollment_count(course_id):
+    # Only popularity pages sort on enrollment_count; other catalog pages
+    # pick up the new count when their cache entry expires
+    if course_id is not None:
+        bump_version(course_version_key(course_id))
+    bump_version(POPULARITY_VERSION_KEY)
+
+def test_version_key(test_id):
+    return f"test_version_{test_id}"
+
+def bump_test_version(test_id):
+    if test_id is not None:
+        bump_version(test_version_key(test_id))
+
+def _request_variant(request):
+    # Anything that changes the shared payload or its rendering
+    variant = f"{request.get_host()}|{request.get_full_path()}|{request.accepted_media_type}"
+    return hashlib.md5(variant.encode()).hexdigest()
+
+def course_detail_cache_key(request, course_id):
+    version = get_version(course_version_key(course_id))
+    return f"course_detail_{CATALOG_PAYLOAD_FORMAT}_{course_id}_{version}_{_request_variant(request)}"
+
+def course_list_cache_key(request):
+    version = get_version(CATALOG_VERSION_KEY)
+    if request.query_params.get('ordering') == 'popular':
+        version = f"{version}_{get_version(POPULARITY_VERSION_KEY)}"
+    return f"course_list_{CATALOG_PAYLOAD_FORMAT}_{version}_{_request_variant(request)}"
+
+def get_or_build(cache_key, build):
+    cached = cache.get(cache_key)
+    if cached is None:
+        cached = build()
+        cache.set(cache_key, cached, settings.CATALOG_CACHE_TIMEOUT)
+    return cached
+
+def make_etag(cache_key, enrolled_flags):
+    flags = ''.join('1' if flag else '0' for flag in enrolled_flags)
+    return quote_etag(hashlib.sha1(f"{cache_key}:{flags}".encode()).hexdigest())
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+def merge_enrollment(items, enrolled_flags):
+    merged = []
+    for item, is_enrolled in zip(items, enrolled_flags):
+        if 'is_enrolled' in item:
+            item = {**item, 'is_enrolled': is_enrolled}
+        merged.append(item)
+    return merged
+
+def enrollment_version_key(user_id):
+    return f"enrollment_version_{user_id}"
+
+def enrolled_courses_key(user_id):
+    return f"enrolled_courses_{user_id}_{get_version(enrollment_version_key(user_id))}"
+
+def get_enrolled_course_ids(user):
+    """
+    The ids of the courses ``user`` is enrolled in, as a frozenset. Loaded
+    lazily from the database and kept in the cache as a packed int64 array.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    key = enrolled_courses_key(user.pk)
+    packed = cache.get(key)
+    if packed is None:
+        course_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
+        packed = array('q', sorted(course_ids)).tobytes()
+        cache.set(key, packed, settings.ENROLLMENT_CACHE_TIMEOUT)
+
+    course_ids = array('q')
+    course_ids.frombytes(packed)
+    return frozenset(course_ids)
+
+def forget_enrolled_course_ids(user_id):
+    # A new version rather than a delete: a reader that loaded the set before
+    # the commit can only store it under the old key, which nobody reads
+    bump_version(enrollment_version_key(user_id))
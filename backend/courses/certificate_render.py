@@ -0,0 +1,34 @@
+import io
+from PIL import Image, ImageDraw, ImageFont
+
+SIZE = (1600, 1131)
+BORDER = '#1976d2'
+INK = '#212121'
+
+def _fit(text, limit=60):
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+def render_certificate(student_name, course_title, grade, certificate_id, issued_on):
+    """
+    PNG and PDF bytes of a certificate. Runs in a worker process, so it only
+    takes and returns plain values and never touches Django.
+    """
+    image = Image.new('RGB', SIZE, 'white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([40, 40, SIZE[0] - 40, SIZE[1] - 40], outline=BORDER, width=12)
+    lines = [
+        ('Certificate of Completion', 72, 260),
+        ('This certifies that', 36, 420),
+        (_fit(student_name), 64, 500),
+        ('has successfully completed', 36, 620),
+        (_fit(course_title), 56, 700),
+        (f'Grade {grade}', 40, 820),
+        (f'{certificate_id}  ·  Issued {issued_on}', 28, 980),
+    ]
+    for text, size, y in lines:
+        draw.text((SIZE[0] / 2, y), text, fill=INK, font=ImageFont.load_default(size=size), anchor='mm')
+
+    png, pdf = io.BytesIO(), io.BytesIO()
+    image.save(png, 'PNG', optimize=True)
+    image.save(pdf, 'PDF', resolution=150)
+    return png.getvalue(), pdf.getvalue()
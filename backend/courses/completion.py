@@ -0,0 +1,163 @@
+import logging
+import secrets
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .certificate_render import render_certificate
+from .models import Achievement, Certificate, TestAttempt
+from .workers import QueueFull, get_pool, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+def award_completion(attempt):
+    # Passing a final test earns the course certificate and achievements,
+    # issued in the background once the grading transaction commits
+    if attempt.test.is_final and attempt.score >= attempt.test.passing_score:
+        attempt_id = attempt.pk
+        transaction.on_commit(lambda: enqueue_awards([attempt_id]))
+
+def enqueue_awards(attempt_ids, block=False, render_claimed=False):
+    """
+    Hand attempts to this process's award pool. Unless ``block`` is set,
+    when the queue stays full for AWARD_ENQUEUE_TIMEOUT seconds the rest are
+    left for the issue_certificates command. ``render_claimed`` says the
+    caller already holds the render claims of their certificates. Returns
+    the futures.
+    """
+    timeout = None if block else settings.AWARD_ENQUEUE_TIMEOUT
+    pool = get_pool('awards', settings.AWARD_WORKERS, settings.AWARD_QUEUE_SIZE)
+    futures = []
+    for index, attempt_id in enumerate(attempt_ids):
+        try:
+            futures.append(pool.submit(_issue_awards_job, attempt_id, render_claimed, timeout=timeout))
+        except QueueFull:
+            logger.warning(f"Award queue is full, {len(attempt_ids) - index} attempts left for issue_certificates")
+            break
+    return futures
+
+def _issue_awards_job(attempt_id, render_claimed):
+    # Runs on an award pool thread, which has its own database connection
+    try:
+        issue_awards(attempt_id, render_claimed)
+    except Exception:
+        logger.exception(f"Issuing awards for test attempt {attempt_id} failed")
+    finally:
+        connection.close()
+
+def claim_render(certificate_id):
+    """
+    Claim rendering a certificate that has no files yet, with a conditional
+    update: only one worker renders it at a time. A claim older than
+    CERTIFICATE_RENDER_CLAIM_SECONDS is presumed lost and can be taken over.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.CERTIFICATE_RENDER_CLAIM_SECONDS)
+    return bool(Certificate.objects.filter(
+        Q(rendering_started_at__isnull=True) | Q(rendering_started_at__lt=stale),
+        pk=certificate_id,
+        document=''
+    ).update(rendering_started_at=now))
+
+def release_render(certificate_id):
+    # Lets the next download or recovery run claim the render straight away
+    Certificate.objects.filter(pk=certificate_id, document='').update(rendering_started_at=None)
+
+def issue_awards(attempt_id, render_claimed=False):
+    """
+    Issue the certificate and achievements of a passed final test and render
+    the certificate, unless another worker holds the render claim. Idempotent:
+    the attempt keys every record, so a retry or a recovery run finds what
+    was issued and only fills in what is missing.
+    """
+    attempt = TestAttempt.objects.select_related('student', 'test__course').get(pk=attempt_id)
+    if not (attempt.test.is_final and attempt.score is not None and attempt.score >= attempt.test.passing_score):
+        return None
+    certificate = create_certificate(attempt)
+    create_achievements(attempt)
+    if not certificate.document and (render_claimed or claim_render(certificate.pk)):
+        try:
+            render_certificate_files(certificate, attempt)
+        except Exception:
+            release_render(certificate.pk)
+            raise
+    return certificate
+
+def create_certificate(attempt):
+    # Determine grade based on score
+    if attempt.score >= 90:
+        grade = 'A'
+    elif attempt.score >= 80:
+        grade = 'B'
+    elif attempt.score >= 70:
+        grade = 'C'
+    else:
+        grade = 'D'
+
+    try:
+        with transaction.atomic():
+            certificate, _ = Certificate.objects.get_or_create(
+                test_attempt=attempt,
+                defaults={
+                    'student': attempt.student,
+                    'course': attempt.test.course,
+                    'certificate_id': f"CERT-{secrets.token_hex(8).upper()}",
+                    'grade': grade,
+                }
+            )
+    except IntegrityError:
+        # Issued concurrently by another worker
+        certificate = Certificate.objects.get(test_attempt=attempt)
+    return certificate
+
+def create_achievements(attempt):
+    # Create certificate achievement
+    achievements = [Achievement(
+        idempotency_key=f"attempt-{attempt.pk}-certificate",
+        student=attempt.student,
+        type='certificate',
+        title=f'Certificate for {attempt.test.course.title}',
+        description=f'Successfully completed {attempt.test.course.title} with grade {attempt.score}%'
+    )]
+
+    # Create discount achievement for high scores
+    if attempt.score >= 90:
+        achievements.append(Achievement(
+            idempotency_key=f"attempt-{attempt.pk}-discount",
+            student=attempt.student,
+            type='discount',
+            title='High Performance Discount',
+            description='Earned 10% discount on next course for achieving 90% or higher',
+            value=10.00
+        ))
+    Achievement.objects.bulk_create(achievements, ignore_conflicts=True)
+
+def render_certificate_files(certificate, attempt):
+    """
+    Render the PNG and PDF in the render process pool and store them. The
+    stored files are the cache: a certificate is only ever stored once, by
+    the holder of its render claim.
+    """
+    pool = get_process_pool('certificates', settings.CERTIFICATE_RENDER_PROCESSES)
+    png, pdf = pool.submit(
+        render_certificate,
+        attempt.student.get_full_name() or attempt.student.username,
+        attempt.test.course.title,
+        certificate.grade,
+        certificate.certificate_id,
+        certificate.issued_at.date().isoformat(),
+    ).result()
+
+    image = certificate.image.storage.save(f"certificates/{certificate.certificate_id}.png", ContentFile(png))
+    document = certificate.document.storage.save(f"certificates/{certificate.certificate_id}.pdf", ContentFile(pdf))
+    if not Certificate.objects.filter(pk=certificate.pk, document='').update(
+        image=image, document=document, rendering_started_at=None
+    ):
+        # Another worker stored its render first
+        certificate.image.storage.delete(image)
+        certificate.document.storage.delete(document)
+        certificate.refresh_from_db(fields=['image', 'document'])
+        return
+    certificate.image.name, certificate.document.name = image, document
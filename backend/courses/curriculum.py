@@ -0,0 +1,128 @@
+from django.db import transaction
+from django.utils import timezone
+from django.utils.duration import duration_string
+from rest_framework.exceptions import ValidationError
+from .cache import bump_course_version
+from .models import Course, Module, Video
+from .search import update_search_vectors
+from .stats import refresh_course_stats
+
+MODULE_FIELDS = ['title', 'description']
+VIDEO_FIELDS = ['title', 'description', 'video_url', 'duration']
+
+def get_curriculum(course_id):
+    """
+    The course -> module -> video tree, read with a single LEFT JOIN query.
+    Returns None when the course does not exist.
+    """
+    rows = Course.objects.filter(pk=course_id).values(
+        'id', 'title',
+        'modules__id', 'modules__title', 'modules__description', 'modules__order',
+        'modules__videos__id', 'modules__videos__title', 'modules__videos__description',
+        'modules__videos__video_url', 'modules__videos__duration', 'modules__videos__order',
+    ).order_by('modules__order', 'modules__videos__order')
+
+    curriculum = None
+    modules = {}
+    for row in rows:
+        if curriculum is None:
+            curriculum = {'id': row['id'], 'title': row['title'], 'modules': []}
+        module_id = row['modules__id']
+        if module_id is None:
+            continue
+        if module_id not in modules:
+            modules[module_id] = {
+                'id': module_id,
+                'title': row['modules__title'],
+                'description': row['modules__description'],
+                'order': row['modules__order'],
+                'videos': [],
+            }
+            curriculum['modules'].append(modules[module_id])
+        if row['modules__videos__id'] is not None:
+            modules[module_id]['videos'].append({
+                'id': row['modules__videos__id'],
+                'title': row['modules__videos__title'],
+                'description': row['modules__videos__description'],
+                'video_url': row['modules__videos__video_url'],
+                'duration': duration_string(row['modules__videos__duration']),
+                'order': row['modules__videos__order'],
+            })
+    return curriculum
+
+def _check_ids(items, existing, label):
+    ids = [item['id'] for item in items if 'id' in item]
+    unknown = set(ids) - set(existing)
+    if unknown:
+        raise ValidationError({label: f"Unknown {label} for this course: {sorted(unknown)}"})
+    if len(ids) != len(set(ids)):
+        raise ValidationError({label: f"Each of the {label} may only appear once"})
+
+def _apply_fields(obj, data, fields, order, now):
+    for field in fields:
+        if field in data:
+            setattr(obj, field, data[field])
+    obj.order = order
+    obj.updated_at = now
+
+def apply_curriculum(course, modules_data):
+    """
+    Make the course's curriculum match ``modules_data``: items are ordered by
+    their position, items without an id are created, and existing modules or
+    videos that are left out are deleted. Runs in one transaction with a
+    fixed number of statements; the (course, order) and (module, order)
+    uniqueness checks are deferred to commit.
+    """
+    now = timezone.now()
+    videos_data = [video for module_data in modules_data for video in module_data.get('videos', [])]
+
+    with transaction.atomic():
+        modules = {module.id: module for module in Module.objects.select_for_update().filter(course=course)}
+        videos = {video.id: video for video in Video.objects.filter(module__course=course)}
+        _check_ids(modules_data, modules, 'modules')
+        _check_ids(videos_data, videos, 'videos')
+
+        module_pairs = []
+        for order, module_data in enumerate(modules_data):
+            if 'id' in module_data:
+                module = modules[module_data['id']]
+            else:
+                module = Module(course=course)
+            _apply_fields(module, module_data, MODULE_FIELDS, order, now)
+            module_pairs.append((module, module_data))
+
+        Module.objects.bulk_update(
+            [module for module, _ in module_pairs if module.pk],
+            MODULE_FIELDS + ['order', 'updated_at']
+        )
+        Module.objects.bulk_create([module for module, _ in module_pairs if not module.pk])
+
+        video_updates, video_creates = [], []
+        for module, module_data in module_pairs:
+            for order, video_data in enumerate(module_data.get('videos', [])):
+                if 'id' in video_data:
+                    video = videos[video_data['id']]
+                    video_updates.append(video)
+                else:
+                    video = Video()
+                    video_creates.append(video)
+                video.module = module
+                _apply_fields(video, video_data, VIDEO_FIELDS, order, now)
+
+        Video.objects.bulk_update(video_updates, VIDEO_FIELDS + ['module', 'order', 'updated_at'])
+        Video.objects.bulk_create(video_creates)
+
+        # Deleted last so videos moved out of a removed module survive it.
+        # Raw deletes skip the per-row post_delete signals and their stats
+        # updates; the stats are refreshed once below. Nothing else references
+        # videos, and a removed module has no videos left by then.
+        kept_videos = {video_data['id'] for video_data in videos_data if 'id' in video_data}
+        kept_modules = {module_data['id'] for module_data in modules_data if 'id' in module_data}
+        removed_videos = Video.objects.filter(pk__in=set(videos) - kept_videos)
+        removed_videos._raw_delete(removed_videos.db)
+        removed_modules = Module.objects.filter(pk__in=set(modules) - kept_modules)
+        removed_modules._raw_delete(removed_modules.db)
+
+        refresh_course_stats([course.id])
+        transaction.on_commit(lambda: update_search_vectors([course.id]))
+        transaction.on_commit(lambda: bump_course_version(course.id))
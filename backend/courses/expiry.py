@@ -0,0 +1,55 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F, Value
+from django.utils import timezone
+from .grading import grade_attempts
+from .models import TestAttempt
+
+EXPIRE_BATCH_SIZE = 500
+
+def attempt_expired(attempt, now=None):
+    # The per-attempt form of expired_attempts(), for an attempt loaded with its test
+    if attempt.test.time_limit is None:
+        return False
+    deadline = attempt.started_at + timedelta(
+        minutes=attempt.test.time_limit, seconds=settings.TEST_TIMEOUT_GRACE_SECONDS
+    )
+    return (now or timezone.now()) > deadline
+
+def _deadline():
+    return ExpressionWrapper(
+        F('started_at') + F('test__time_limit') * Value(timedelta(minutes=1)),
+        output_field=DateTimeField()
+    )
+
+def expired_attempts(now=None):
+    """
+    In-progress attempts of timed tests whose time limit, plus the grace
+    period, has run out. The started_at bound lets the (status, started_at)
+    index narrow the scan before the per-test deadline is checked.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.TEST_TIMEOUT_GRACE_SECONDS)
+    return TestAttempt.objects.filter(
+        status='in_progress',
+        started_at__lt=cutoff,
+        test__time_limit__isnull=False,
+    ).alias(deadline=_deadline()).filter(deadline__lt=cutoff)
+
+def expire_attempts(batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Time out and grade every expired attempt, one batch per transaction.
+    Rows locked by a concurrent submit or sweeper are skipped, not waited on.
+    Returns the number of attempts timed out.
+    """
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                expired_attempts().select_for_update(of=('self',), skip_locked=True)
+                .only('id', 'test_id', 'started_at').order_by('started_at')[:batch_size]
+            )
+            if not batch:
+                return expired
+            grade_attempts(batch, final_status='timeout')
+        expired += len(batch)
@@ -0,0 +1,236 @@
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, IntegerField, Q, Value
+from django.db.models.functions import Cast, Extract, Floor
+from django.utils import timezone
+from .analytics import record_item_stats
+from .answer_keys import get_answer_key, get_answer_keys
+from .completion import award_completion
+from .matching import match_text_answer
+from .models import ChoiceAttempt, CodeTestCase, QuestionAttempt, TestAttempt
+from .sandbox import get_pool, run_submission
+from .workers import QueueFull
+
+logger = logging.getLogger(__name__)
+
+CHOICE_TYPES = ('multiple_choice', 'single_choice')
+GRADE_BATCH_SIZE = 500
+
+def _time_taken(now):
+    # Whole seconds since the attempt started, matching int(timedelta.total_seconds())
+    return Cast(Floor(Extract(
+        ExpressionWrapper(Value(now) - F('started_at'), output_field=DurationField()), 'epoch'
+    )), IntegerField())
+
+def score_percent(earned_points, total_points):
+    return int((earned_points / total_points) * 100) if total_points > 0 else 0
+
+def score_question(entry, selected, answer_text=None, accepted=None):
+    # A choice question is right only when the selection is exactly the set of
+    # correct choices, a text question when the answer matches an accepted
+    # answer. Text questions without accepted answers and code questions
+    # without test cases are not checked.
+    question_type, points, correct = entry
+    if question_type in CHOICE_TYPES:
+        is_correct = selected == correct
+    elif accepted is not None:
+        is_correct = match_text_answer(accepted, answer_text)
+    else:
+        is_correct = True
+    return is_correct, points if is_correct else 0
+
+def _grade_batch(attempts, answer_keys, now, final_status):
+    attempt_ids = [attempt.pk for attempt in attempts]
+    question_attempts = QuestionAttempt.objects.filter(
+        test_attempt_id__in=attempt_ids
+    ).values_list(
+        'id', 'test_attempt_id', 'question_id', 'answer_text', 'code_submission',
+        'is_correct', 'points_earned', 'grading_pending'
+    )
+
+    selected = defaultdict(set)
+    for question_attempt_id, choice_id in ChoiceAttempt.objects.filter(
+        question_attempt__test_attempt_id__in=attempt_ids, is_selected=True
+    ).values_list('question_attempt_id', 'choice_id'):
+        selected[question_attempt_id].add(choice_id)
+
+    test_ids = {attempt.pk: attempt.test_id for attempt in attempts}
+    code_cases = load_code_test_cases({
+        question_id
+        for test_id in set(test_ids.values())
+        for question_id, (question_type, _, _) in answer_keys[test_id].questions.items()
+        if question_type == 'code'
+    })
+    totals = defaultdict(lambda: [0, 0])
+    changed = defaultdict(list)
+    code_jobs = []
+    for question_attempt_id, attempt_id, question_id, answer_text, code_submission, *current in question_attempts:
+        answer_key = answer_keys[test_ids[attempt_id]]
+        entry = answer_key.get(question_id)
+        if entry is None:
+            # The question was deleted after the attempt started
+            continue
+        if question_id in code_cases:
+            # Scored later by the sandbox, blank submissions fail outright
+            grade = (False, 0, bool(code_submission and code_submission.strip()))
+            if grade[2]:
+                code_jobs.append((question_attempt_id, attempt_id, code_submission, code_cases[question_id], entry[1]))
+        else:
+            grade = (*score_question(
+                entry,
+                selected.get(question_attempt_id, frozenset()),
+                answer_text,
+                answer_key.text_answers.get(question_id)
+            ), False)
+        if grade != tuple(current):
+            changed[grade].append(question_attempt_id)
+        attempt_totals = totals[attempt_id]
+        attempt_totals[0] += entry[1]
+        attempt_totals[1] += grade[1]
+
+    pending_attempts = {job[1] for job in code_jobs}
+    results = {}
+    by_outcome = defaultdict(list)
+    for attempt in attempts:
+        total_points, earned_points = totals[attempt.pk]
+        attempt.score = score_percent(earned_points, total_points)
+        # Submitted attempts wait in 'grading' for their code results
+        if final_status == 'completed' and attempt.pk in pending_attempts:
+            attempt.status = 'grading'
+        else:
+            attempt.status = final_status
+        attempt.completed_at = now
+        attempt.time_taken = int((now - attempt.started_at).total_seconds())
+        by_outcome[attempt.score, attempt.status].append(attempt.pk)
+        results[attempt.pk] = {
+            'score': attempt.score,
+            'total_points': total_points,
+            'earned_points': earned_points,
+        }
+
+    # Only a handful of distinct (is_correct, points) outcomes exist, so one
+    # UPDATE per outcome is far cheaper than a CASE per row. Rows already
+    # holding their grade (wrong answers at the defaults) are not rewritten.
+    for (is_correct, points_earned, grading_pending), ids in changed.items():
+        QuestionAttempt.objects.filter(pk__in=ids).update(
+            is_correct=is_correct, points_earned=points_earned, grading_pending=grading_pending
+        )
+    for (score, attempt_status), ids in by_outcome.items():
+        TestAttempt.objects.filter(pk__in=ids).update(
+            score=score, status=attempt_status, completed_at=now, time_taken=_time_taken(now)
+        )
+
+    # Attempts still waiting on code results are recorded when they finish
+    finished = [attempt.pk for attempt in attempts if attempt.pk not in pending_attempts]
+    if finished:
+        record_item_stats(Q(pk__in=finished))
+    return results, code_jobs
+
+def load_code_test_cases(question_ids):
+    # {question_id: [(input, expected_output), ...]} for code questions that have test cases
+    cases = defaultdict(list)
+    for question_id, case_input, expected_output in CodeTestCase.objects.filter(
+        question_id__in=question_ids
+    ).values_list('question_id', 'input', 'expected_output'):
+        cases[question_id].append((case_input, expected_output))
+    return cases
+
+def grade_attempts(attempts, batch_size=GRADE_BATCH_SIZE, final_status='completed'):
+    """
+    Grade in-progress attempts and give them ``final_status``. Each batch reads
+    question attempts and selected choices with one query each and writes
+    one UPDATE per distinct outcome, plus the cached answer keys read once
+    up front, so the cost does not grow with the number of questions.
+    Attempts with code submissions to run are left in the 'grading' status
+    and finished by the sandbox pool once the transaction commits.
+    Returns {attempt_id: {'score', 'total_points', 'earned_points'}}.
+    """
+    attempts = list(attempts)
+    answer_keys = get_answer_keys({attempt.test_id for attempt in attempts})
+    now = timezone.now()
+    results = {}
+    code_jobs = []
+    with transaction.atomic():
+        for start in range(0, len(attempts), batch_size):
+            batch_results, batch_jobs = _grade_batch(
+                attempts[start:start + batch_size], answer_keys, now, final_status
+            )
+            results.update(batch_results)
+            code_jobs.extend(batch_jobs)
+        if code_jobs:
+            transaction.on_commit(lambda: enqueue_code_grading(code_jobs))
+    return results
+
+def grade_code_submission(question_attempt_id, attempt_id, source, cases, points):
+    # Runs on a sandbox pool thread, which has its own database connection
+    try:
+        passed = run_submission(source, cases)
+        with transaction.atomic():
+            # With the attempt locked exactly one job clears its last pending
+            # answer, so the attempt is finalized once
+            TestAttempt.objects.select_for_update().filter(pk=attempt_id).values_list('pk', flat=True).first()
+            cleared = QuestionAttempt.objects.filter(pk=question_attempt_id, grading_pending=True).update(
+                is_correct=passed, points_earned=points if passed else 0, grading_pending=False
+            )
+            if cleared:
+                finalize_attempt(attempt_id)
+    except Exception:
+        logger.exception(f"Grading code for question attempt {question_attempt_id} failed")
+    finally:
+        connection.close()
+
+def enqueue_code_grading(jobs, block=False):
+    """
+    Hand code jobs to this process's sandbox pool. Unless ``block`` is set,
+    when the queue stays full for CODE_GRADING_ENQUEUE_TIMEOUT seconds the
+    remaining jobs are left pending for the grade_code_submissions command.
+    Returns the futures.
+    """
+    timeout = None if block else settings.CODE_GRADING_ENQUEUE_TIMEOUT
+    pool = get_pool()
+    futures = []
+    for index, job in enumerate(jobs):
+        try:
+            futures.append(pool.submit(grade_code_submission, *job, timeout=timeout))
+        except QueueFull:
+            logger.warning(f"Code grading queue is full, {len(jobs) - index} submissions left pending")
+            break
+    return futures
+
+def finalize_attempt(attempt_id):
+    """
+    Complete a 'grading' attempt once none of its code submissions are
+    pending: recompute the score from the stored points, record it in the
+    item analytics and award the certificate. Timed-out attempts get their
+    score updated the same way but keep their status and earn nothing; they
+    must only be finalized by the job that cleared their last pending answer.
+    """
+    with transaction.atomic():
+        attempt = TestAttempt.objects.select_for_update(of=('self',)).select_related(
+            'student', 'test__course'
+        ).filter(pk=attempt_id, status__in=['grading', 'timeout']).first()
+        if attempt is None or QuestionAttempt.objects.filter(
+            test_attempt_id=attempt_id, grading_pending=True
+        ).exists():
+            return None
+
+        answer_key = get_answer_key(attempt.test_id)
+        total_points = earned_points = 0
+        for question_id, points_earned in QuestionAttempt.objects.filter(
+            test_attempt_id=attempt_id
+        ).values_list('question_id', 'points_earned'):
+            entry = answer_key.get(question_id)
+            if entry is not None:
+                total_points += entry[1]
+                earned_points += points_earned
+        attempt.score = score_percent(earned_points, total_points)
+        timed_out = attempt.status == 'timeout'
+        attempt.status = attempt.status if timed_out else 'completed'
+        attempt.save(update_fields=['score', 'status'])
+        record_item_stats(Q(pk=attempt_id))
+    if timed_out:
+        return None
+    award_completion(attempt)
+    return attempt
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import wait
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.grading import load_code_test_cases
+from courses.models import CodeTestCase, Course, Question, QuestionAttempt, Test, TestAttempt
+from courses.sandbox import get_pool, run_submission
+from users.models import User
+
+# Every other submission is right; the wrong ones still run every case until the first mismatch
+SUBMISSIONS = [
+    'a, b = map(int, input().split())\nprint(a + b)\n',
+    'a, b = map(int, input().split())\nprint(a - b)\n',
+]
+
+class Command(BaseCommand):
+    help = (
+        'Compare code submission throughput run one at a time against the sandbox '
+        'pool, on sample submissions that are rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=40)
+        parser.add_argument('--cases', type=int, default=3, help='Test cases per question')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            jobs = self.create_submissions(options['submissions'], options['cases'])
+            transaction.set_rollback(True)
+
+        serial, serial_passed = self.measure_serial(jobs)
+        pooled, pooled_passed = self.measure_pool(jobs)
+        if serial_passed != pooled_passed:
+            self.stdout.write(self.style.WARNING(
+                f'The pool passed {pooled_passed} submissions, running them one at a time passed {serial_passed}'
+            ))
+        self.stdout.write(
+            f"{len(jobs)} submissions x {options['cases']} cases: serial {self.summary(serial, len(jobs))}, "
+            f"pool of {settings.CODE_GRADING_WORKERS} {self.summary(pooled, len(jobs))}, {serial / pooled:.1f}x"
+        )
+        self.stdout.write(self.style.SUCCESS('Sample submissions rolled back'))
+
+    def create_submissions(self, submissions, cases):
+        instructor = User.objects.create_user('benchmark-instructor', 'benchmark@example.com', user_type='instructor')
+        course = Course.objects.create(
+            title='Benchmark course',
+            description='Benchmark course',
+            image='courses/benchmark.png',
+            price='10.00',
+            duration=timedelta(hours=2),
+            instructor=instructor,
+            level='beginner'
+        )
+        test = Test.objects.create(course=course, title='Benchmark test', description='Benchmark test')
+        question = Question.objects.create(test=test, question_type='code', text='Add two numbers', points=5)
+        CodeTestCase.objects.bulk_create([
+            CodeTestCase(question=question, input=f'{i} {i + 1}\n', expected_output=f'{2 * i + 1}\n', order=i)
+            for i in range(cases)
+        ])
+
+        students = User.objects.bulk_create([
+            User(username=f'benchmark-student-{i}', email=f'student{i}@example.com') for i in range(submissions)
+        ])
+        attempts = TestAttempt.objects.bulk_create([
+            TestAttempt(test=test, student=student, status='grading') for student in students
+        ])
+        QuestionAttempt.objects.bulk_create([
+            QuestionAttempt(
+                test_attempt=attempt,
+                question=question,
+                code_submission=SUBMISSIONS[i % len(SUBMISSIONS)],
+                grading_pending=True
+            )
+            for i, attempt in enumerate(attempts)
+        ])
+
+        # Read back the way grade_code_submissions does
+        rows = list(QuestionAttempt.objects.filter(
+            grading_pending=True, test_attempt__test=test
+        ).order_by('pk').values_list('question_id', 'code_submission'))
+        code_cases = load_code_test_cases({question_id for question_id, _ in rows})
+        return [(source, code_cases[question_id]) for question_id, source in rows]
+
+    def measure_serial(self, jobs):
+        started = time.perf_counter()
+        passed = sum(run_submission(source, cases) for source, cases in jobs)
+        return time.perf_counter() - started, passed
+
+    def measure_pool(self, jobs):
+        pool = get_pool()
+        started = time.perf_counter()
+        # Blocks for room in the queue, like the recovery command
+        futures = [pool.submit(run_submission, source, cases) for source, cases in jobs]
+        wait(futures)
+        elapsed = time.perf_counter() - started
+        return elapsed, sum(future.result() for future in futures)
+
+    def summary(self, elapsed, submissions):
+        return f"{elapsed:.2f}s ({submissions / elapsed:.1f}/s)"
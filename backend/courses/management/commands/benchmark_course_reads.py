@@ -0,0 +1,98 @@
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from courses.models import Course, Module, Video
+from courses.stats import refresh_course_stats
+from courses.views import CourseViewSet
+from users.models import User
+
+# The cache would serve every request after the first, so it is switched off
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+class Command(BaseCommand):
+    help = (
+        'Compare course list and detail reads through the serializers against '
+        'the .values()/orjson fast path, on sample courses that are rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--modules', type=int, default=4)
+        parser.add_argument('--videos', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=30)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.create_courses(options['courses'], options['modules'], options['videos'])
+            course_id = Course.objects.filter(instructor=user).values_list('pk', flat=True).first()
+            page_size = min(options['courses'], 100)
+            requests = [
+                ('list', 'list', {'page_size': page_size}, {}),
+                ('list ?expand=modules', 'list', {'page_size': page_size, 'expand': 'modules'}, {}),
+                ('detail', 'retrieve', {}, {'pk': str(course_id)}),
+            ]
+            for label, action, params, kwargs in requests:
+                serializer = self.measure(user, action, params, kwargs, options['requests'], fast=False)
+                fast = self.measure(user, action, params, kwargs, options['requests'], fast=True)
+                self.stdout.write(
+                    f"{label}: serializer {self.summary(serializer)}, fast path {self.summary(fast)}, "
+                    f"{statistics.mean(serializer) / statistics.mean(fast):.1f}x"
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Sample courses rolled back'))
+
+    def create_courses(self, courses, modules, videos):
+        user = User.objects.create_user('benchmark-instructor', 'benchmark@example.com', user_type='instructor')
+        created = Course.objects.bulk_create([
+            Course(
+                title=f'Benchmark course {i}',
+                description='Benchmark course',
+                image='courses/benchmark.png',
+                price='10.00',
+                duration=timedelta(hours=2),
+                instructor=user,
+                level='beginner'
+            )
+            for i in range(courses)
+        ])
+        created_modules = Module.objects.bulk_create([
+            Module(course=course, title=f'Module {m}', description='Benchmark module', order=m)
+            for course in created for m in range(modules)
+        ])
+        Video.objects.bulk_create([
+            Video(
+                module=module,
+                title=f'Video {v}',
+                description='Benchmark video',
+                video_url='https://example.com/video',
+                duration=timedelta(minutes=5),
+                order=v
+            )
+            for module in created_modules for v in range(videos)
+        ])
+        refresh_course_stats([course.pk for course in created])
+        return user
+
+    def measure(self, user, action, params, kwargs, requests, fast):
+        view = CourseViewSet.as_view({'get': action})
+        factory = APIRequestFactory()
+        latencies = []
+        with override_settings(FAST_READ_PATH=fast, CACHES=NO_CACHE):
+            # One untimed request first, to leave out connection and import warm-up
+            for _ in range(requests + 1):
+                request = factory.get('/api/courses/courses/', params)
+                force_authenticate(request, user=user)
+                started = time.perf_counter()
+                response = view(request, **kwargs)
+                response.render()
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{action} returned {response.status_code}")
+        return latencies[1:]
+
+    def summary(self, latencies):
+        return f"mean {statistics.mean(latencies):.2f}ms p50 {statistics.median(latencies):.2f}ms"
@@ -0,0 +1,90 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from courses.grading import grade_attempts
+from courses.models import Choice, ChoiceAttempt, Course, Question, QuestionAttempt, Test, TestAttempt
+from users.models import User
+
+class Command(BaseCommand):
+    help = (
+        'Time grading one long test attempt and a batch of attempts, with their '
+        'query counts, on sample data that is rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=200, help='Questions in the single attempt')
+        parser.add_argument('--attempts', type=int, default=1000, help='Attempts in the batch')
+        parser.add_argument('--batch-questions', type=int, default=20, help='Questions per attempt in the batch')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            instructor = User.objects.create_user('benchmark-instructor', 'benchmark@example.com', user_type='instructor')
+            course = Course.objects.create(
+                title='Benchmark course',
+                description='Benchmark course',
+                image='courses/benchmark.png',
+                price='10.00',
+                duration=timedelta(hours=2),
+                instructor=instructor,
+                level='beginner'
+            )
+
+            single = self.create_attempts(course, options['questions'], 1, rng)
+            self.report(f"1 attempt x {options['questions']} questions", single)
+
+            batch = self.create_attempts(course, options['batch_questions'], options['attempts'], rng)
+            self.report(f"{options['attempts']} attempts x {options['batch_questions']} questions", batch)
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Sample attempts rolled back'))
+
+    def create_attempts(self, course, questions, attempts, rng):
+        # Every third question is an unchecked text question, the rest have two correct choices out of four
+        test = Test.objects.create(course=course, title='Benchmark test', description='Benchmark test')
+        created_questions = Question.objects.bulk_create([
+            Question(
+                test=test,
+                question_type='text' if i % 3 == 0 else 'multiple_choice',
+                text=f'Question {i}',
+                points=1 + i % 3,
+                order=i
+            )
+            for i in range(questions)
+        ])
+        choices = Choice.objects.bulk_create([
+            Choice(question=question, text=f'Choice {j}', is_correct=j < 2, order=j)
+            for question in created_questions for j in range(4)
+        ])
+
+        students = User.objects.bulk_create([
+            User(username=f'benchmark-student-{test.pk}-{i}', email=f'student{i}@example.com')
+            for i in range(attempts)
+        ])
+        test_attempts = TestAttempt.objects.bulk_create([
+            TestAttempt(test=test, student=student) for student in students
+        ])
+        question_attempts = QuestionAttempt.objects.bulk_create([
+            QuestionAttempt(test_attempt=attempt, question=question)
+            for attempt in test_attempts for question in created_questions
+        ])
+        choices_by_question = {}
+        for choice in choices:
+            choices_by_question.setdefault(choice.question_id, []).append(choice)
+        ChoiceAttempt.objects.bulk_create([
+            ChoiceAttempt(question_attempt=question_attempt, choice=choice, is_selected=True)
+            for question_attempt in question_attempts
+            for choice in choices_by_question[question_attempt.question_id]
+            if rng.random() < (0.9 if choice.is_correct else 0.3)
+        ])
+        return list(TestAttempt.objects.filter(test=test))
+
+    def report(self, label, attempts):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            grade_attempts(attempts)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {elapsed * 1000:.0f}ms, {len(queries)} queries")
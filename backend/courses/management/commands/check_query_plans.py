@@ -0,0 +1,143 @@
+import json
+import random
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from courses.models import Course, Enrollment, Module, Test, TestAttempt, Video
+from payments.models import Payment
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = (
+        'Seed realistic volumes inside a rolled-back transaction, EXPLAIN the hot '
+        'ORM queries and fail if any of them plans a sequential scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Multiplier for the seeded row counts')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plans are only checked against PostgreSQL')
+
+        failures = []
+        with transaction.atomic():
+            sample = self.seed(options['scale'])
+            with connection.cursor() as cursor:
+                for model in [User, Course, Enrollment, Module, Video, Test, TestAttempt, Payment]:
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+            for name, queryset in self.hot_queries(sample):
+                plan = json.loads(queryset.explain(format='json'))
+                seq_scans = sorted(set(self.seq_scans(plan[0]['Plan'])))
+                if options['verbose_plans']:
+                    self.stdout.write(f'{name}:\n{queryset.explain()}\n')
+                if seq_scans:
+                    failures.append(f"{name}: sequential scan on {', '.join(seq_scans)}")
+                    self.stdout.write(self.style.ERROR(f'FAIL {name}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'ok   {name}'))
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError('Hot queries fell back to sequential scans:\n' + '\n'.join(failures))
+
+    def seq_scans(self, node):
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from self.seq_scans(child)
+
+    def seed(self, scale):
+        rng = random.Random(0)
+        users = User.objects.bulk_create([
+            User(username=f'plan-user-{i}', email=f'plan-user-{i}@example.com', password='!',
+                 user_type='instructor' if i % 50 == 0 else 'student')
+            for i in range(5000 * scale)
+        ])
+        instructors = [user for user in users if user.user_type == 'instructor']
+        students = [user for user in users if user.user_type == 'student']
+
+        courses = Course.objects.bulk_create([
+            Course(title=f'Course {i}', description='Seeded course', image='courses/seed.png',
+                   price=rng.choice([0, 49, 99]), duration=timedelta(hours=10),
+                   instructor=rng.choice(instructors), level=rng.choice(Course.LEVEL_CHOICES)[0],
+                   is_paid=rng.random() < 0.7)
+            for i in range(2000 * scale)
+        ])
+        modules = Module.objects.bulk_create([
+            Module(course=course, title=f'Module {order}', description='', order=order)
+            for course in courses for order in range(5)
+        ])
+        Video.objects.bulk_create([
+            Video(module=module, title=f'Video {order}', description='', video_url='https://example.com/v',
+                  duration=timedelta(minutes=10), order=order)
+            for module in modules for order in range(4)
+        ])
+
+        enrollment_pairs = {(rng.choice(students).pk, rng.choice(courses).pk) for _ in range(40000 * scale)}
+        enrollments = Enrollment.objects.bulk_create([
+            Enrollment(student_id=student_id, course_id=course_id) for student_id, course_id in enrollment_pairs
+        ])
+        payments = Payment.objects.bulk_create([
+            Payment(enrollment=enrollment, amount=49, payment_method='click', card_type='uzcard',
+                    status='completed', transaction_id=f'plan-tx-{i}', payment_id=f'plan-pay-{i}')
+            for i, enrollment in enumerate(enrollments[:20000 * scale])
+        ])
+
+        tests = Test.objects.bulk_create([
+            Test(course=course, title='Final', description='', is_final=True) for course in courses
+        ])
+        attempts, active = [], set()
+        for i, enrollment in enumerate(enrollments[:30000 * scale]):
+            test_id = rng.choice(tests).pk
+            # Only one in-progress attempt per (test, student) is allowed
+            in_progress = i % 10 == 0 and (test_id, enrollment.student_id) not in active
+            if in_progress:
+                active.add((test_id, enrollment.student_id))
+            attempts.append(TestAttempt(
+                test_id=test_id, student_id=enrollment.student_id,
+                status='in_progress' if in_progress else 'completed', score=rng.randint(0, 100)
+            ))
+        TestAttempt.objects.bulk_create(attempts)
+
+        return {
+            'student': enrollments[0].student_id,
+            'course': enrollments[0].course_id,
+            'instructor': instructors[0].pk,
+            'test': tests[0].pk,
+            'module': modules[0].pk,
+            'payment_id': payments[len(payments) // 2].payment_id,
+            'username': students[len(students) // 2].username,
+        }
+
+    def hot_queries(self, sample):
+        page = 21  # page_size + 1, as fetched by the cursor paginator
+        return [
+            ('course list', Course.objects.order_by('-created_at', '-id')[:page]),
+            ('course list by level', Course.objects.filter(level='advanced').order_by('-created_at', '-id')[:page]),
+            ('course list by is_paid', Course.objects.filter(is_paid=False).order_by('-created_at', '-id')[:page]),
+            ('course list by instructor', Course.objects.filter(
+                instructor_id=sample['instructor']).order_by('-created_at', '-id')[:page]),
+            ('course list by popularity', Course.objects.order_by('-enrollment_count', '-id')[:page]),
+            ('modules of a course', Module.objects.filter(course_id=sample['course'])),
+            ('videos of a module', Video.objects.filter(module_id=sample['module'])),
+            ('enrolled course ids', Enrollment.objects.filter(
+                student_id=sample['student']).values_list('course_id', flat=True)),
+            ('enrollment by student and course', Enrollment.objects.filter(
+                student_id=sample['student'], course_id=sample['course'])),
+            ('enrollment list', Enrollment.objects.filter(
+                student_id=sample['student']).order_by('-enrolled_at', '-id')[:page]),
+            ('in-progress attempt', TestAttempt.objects.filter(
+                test_id=sample['test'], student_id=sample['student'], status='in_progress')),
+            ('attempt list', TestAttempt.objects.filter(
+                test_id=sample['test'], student_id=sample['student']).order_by('-started_at', '-id')[:page]),
+            ('payment by payment_id', Payment.objects.filter(payment_id=sample['payment_id'])),
+            ('payment list', Payment.objects.filter(
+                enrollment__student_id=sample['student']).order_by('-created_at', '-id')[:page]),
+            ('user by username', User.objects.filter(username=sample['username'])),
+        ]
@@ -0,0 +1,30 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from courses.expiry import EXPIRE_BATCH_SIZE, expire_attempts
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Time out and grade in-progress attempts of timed tests whose time limit has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRE_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping instead of running once')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+            close_old_connections()
+
+    def sweep(self, batch_size):
+        started = time.perf_counter()
+        expired = expire_attempts(batch_size)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Expired {expired} test attempts in {elapsed:.3f}s")
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} test attempts in {elapsed:.3f}s'))
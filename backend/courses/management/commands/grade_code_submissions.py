@@ -0,0 +1,58 @@
+import logging
+import time
+from concurrent.futures import wait
+from django.core.management.base import BaseCommand
+from courses.answer_keys import get_answer_keys
+from courses.grading import enqueue_code_grading, finalize_attempt, load_code_test_cases
+from courses.models import QuestionAttempt, TestAttempt
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run pending code submissions through the sandbox pool and finish their attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # Submitted attempts wait in 'grading'; ones timed out by the sweeper or a
+        # late save keep 'timeout' but still need their code run for a score
+        rows = list(QuestionAttempt.objects.filter(
+            grading_pending=True, test_attempt__status__in=['grading', 'timeout']
+        ).order_by('pk').values_list(
+            'id', 'test_attempt_id', 'test_attempt__test_id', 'question_id', 'code_submission'
+        ))
+        answer_keys = get_answer_keys({row[2] for row in rows})
+        code_cases = load_code_test_cases({row[3] for row in rows})
+        ungradable = {row[3] for row in rows} - set(code_cases)
+        if ungradable:
+            # Their test cases were deleted: run_submission fails them rather than pass them unchecked
+            logger.warning(f"Code questions {sorted(ungradable)} have no test cases, their submissions are marked wrong")
+
+        started = time.perf_counter()
+        graded = 0
+        for start in range(0, len(rows), batch_size):
+            jobs = [
+                (question_attempt_id, attempt_id, source, code_cases.get(question_id, []),
+                 answer_keys[test_id].get(question_id)[1])
+                for question_attempt_id, attempt_id, test_id, question_id, source in rows[start:start + batch_size]
+                if answer_keys[test_id].get(question_id) is not None
+            ]
+            # Waits for room in the queue instead of giving up on a full one
+            futures = enqueue_code_grading(jobs, block=True)
+            wait(futures)
+            graded += len(futures)
+        elapsed = time.perf_counter() - started
+
+        # Attempts whose last job finished without completing them. Timed-out
+        # attempts are only finalized by the job that clears their last pending
+        # answer, which the loop above has just run.
+        finalized = 0
+        for attempt_id in TestAttempt.objects.filter(status='grading').values_list('pk', flat=True):
+            finalized += finalize_attempt(attempt_id) is not None
+
+        rate = graded / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Graded {graded} submissions in {elapsed:.1f}s ({rate:.1f}/s), finalized {finalized} attempts'
+        ))
@@ -0,0 +1,30 @@
+import logging
+import time
+from concurrent.futures import wait
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from courses.completion import enqueue_awards
+from courses.models import TestAttempt
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Issue and render missing certificates and achievements of passed final tests'
+
+    def handle(self, *args, **options):
+        attempt_ids = list(TestAttempt.objects.filter(
+            Q(certificate__isnull=True) | Q(certificate__document=''),
+            status='completed',
+            test__is_final=True,
+            score__gte=F('test__passing_score'),
+        ).values_list('id', flat=True))
+
+        started = time.perf_counter()
+        # Block on a full queue instead of dropping attempts
+        futures = enqueue_awards(attempt_ids, block=True)
+        wait(futures)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Issued awards for {len(futures)} test attempts in {elapsed:.3f}s")
+        self.stdout.write(self.style.SUCCESS(
+            f'Issued awards for {len(futures)} test attempts in {elapsed:.3f}s'
+        ))
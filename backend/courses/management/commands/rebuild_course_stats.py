@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from courses.models import Course
+from courses.stats import refresh_course_stats
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized enrollment, module and video counters of every course'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(course_ids), batch_size):
+            updated += refresh_course_stats(course_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Updated stats for {updated} courses'))
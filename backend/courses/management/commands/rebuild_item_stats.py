@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.analytics import rebuild_item_stats
+from courses.models import ChoiceStats, QuestionStats
+
+class Command(BaseCommand):
+    help = 'Recompute the per-question and per-choice analytics rollups from every finished test attempt'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_item_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {QuestionStats.objects.count()} questions and {ChoiceStats.objects.count()} choices'
+        ))
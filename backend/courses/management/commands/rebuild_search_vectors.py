@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from courses.models import Course
+from courses.search import update_search_vectors
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search vector of every course'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(course_ids), batch_size):
+            updated += update_search_vectors(course_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Updated search vectors for {updated} courses'))
@@ -0,0 +1,54 @@
+import unicodedata
+
+def normalize_answer(text):
+    """
+    Canonical form of a text answer: NFKC-normalized, case-folded, with
+    punctuation dropped and runs of whitespace collapsed to single spaces.
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = ''.join(' ' if unicodedata.category(char).startswith('P') else char for char in text)
+    return ' '.join(text.split())
+
+def within_edit_distance(a, b, limit):
+    # Levenshtein distance <= limit, filling only the diagonal band of the
+    # table that can stay within the limit and stopping once a row exceeds it
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [limit + 1] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != b[j - 1]),
+            )
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+def compile_accepted_answers(answers, max_edit_distance):
+    # (normalized answers, max edit distance), or None when nothing is accepted
+    normalized = frozenset(filter(None, (normalize_answer(answer) for answer in answers)))
+    if not normalized:
+        return None
+    return normalized, max_edit_distance
+
+def match_text_answer(accepted, text):
+    """
+    Whether ``text`` matches one of the compiled accepted answers: a set
+    lookup first, then a bounded edit-distance comparison when the question
+    allows typos.
+    """
+    answers, max_edit_distance = accepted
+    text = normalize_answer(text)
+    if not text:
+        return False
+    if text in answers:
+        return True
+    return max_edit_distance > 0 and any(
+        within_edit_distance(text, answer, max_edit_distance) for answer in answers
+    )
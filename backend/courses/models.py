@@ -1,7 +1,15 @@
+from datetime import timedelta
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+# Written only by the F() updates and rebuilds in courses.signals, courses.search and courses.stats
+MAINTAINED_COURSE_FIELDS = frozenset([
+    'search_vector', 'enrollment_count', 'module_count', 'video_count', 'total_video_duration'
+])
+
 class Course(models.Model):
     LEVEL_CHOICES = (
         ('beginner', 'Beginner'),
@@ -24,12 +32,38 @@ class Course(models.Model):
         through='Enrollment',
         related_name='enrolled_courses'
     )
+    # Title, description, module and video titles; maintained by courses.signals
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized counters, maintained by courses.signals
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    module_count = models.PositiveIntegerField(default=0, editable=False)
+    video_count = models.PositiveIntegerField(default=0, editable=False)
+    total_video_duration = models.DurationField(default=timedelta(0), editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Saving the counters loaded with the instance would undo concurrent increments
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MAINTAINED_COURSE_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+            models.Index(fields=['level', '-created_at', '-id'], name='course_level_created_idx'),
+            models.Index(fields=['is_paid', '-created_at', '-id'], name='course_paid_created_idx'),
+            models.Index(fields=['instructor', '-created_at', '-id'], name='course_instructor_created_idx'),
+            GinIndex(fields=['search_vector'], name='course_search_idx'),
+            models.Index(fields=['-enrollment_count', '-id'], name='course_popular_idx'),
+        ]
 
 class Enrollment(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -50,6 +84,9 @@ class Enrollment(models.Model):
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-enrolled_at']
+        indexes = [
+            models.Index(fields=['student', '-enrolled_at', '-id'], name='enrollment_student_recent_idx'),
+        ]
 
 class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
@@ -61,7 +98,14 @@ class Module(models.Model):
 
     class Meta:
         ordering = ['order']
-        unique_together = ['course', 'order']
+        constraints = [
+            # Deferred to commit so a whole curriculum can be reordered in one UPDATE
+            models.UniqueConstraint(
+                fields=['course', 'order'],
+                name='unique_module_order',
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
@@ -78,7 +122,13 @@ class Video(models.Model):
 
     class Meta:
         ordering = ['order']
-        unique_together = ['module', 'order']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['module', 'order'],
+                name='unique_video_order',
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
 
     def __str__(self):
         return f"{self.module.title} - {self.title}"
@@ -115,6 +165,8 @@ class Question(models.Model):
     text = models.TextField()
     points = models.IntegerField(default=1)
     order = models.IntegerField(default=0)
+    accepted_answers = models.JSONField(default=list, blank=True)  # for text questions
+    max_edit_distance = models.PositiveSmallIntegerField(default=0)  # typos tolerated in text answers
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -137,14 +189,67 @@ class Choice(models.Model):
     def __str__(self):
         return f"{self.question.text[:50]} - Choice {self.order}"
 
+class CodeTestCase(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='code_test_cases')
+    input = models.TextField(blank=True)  # fed to the submission on stdin
+    expected_output = models.TextField()
+    order = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['order']
+
+    def __str__(self):
+        return f"{self.question.text[:50]} - Test case {self.order}"
+
+class TestSnapshot(models.Model):
+    # Frozen, student-facing test paper: questions, choices and total points, no correct flags
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='snapshots')
+    version = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=40)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['test', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'version'], name='unique_test_snapshot_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.test.title} - Snapshot {self.version}"
+
+class QuestionStats(models.Model):
+    # Running sums over graded attempts, added to as attempts are graded
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    score_sum = models.BigIntegerField(default=0)
+    correct_score_sum = models.BigIntegerField(default=0)
+    score_square_sum = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.question.text[:50]} - {self.attempts} attempts"
+
+class ChoiceStats(models.Model):
+    choice = models.OneToOneField(Choice, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    selections = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.choice.text[:50]} - {self.selections} selections"
+
 class TestAttempt(models.Model):
     STATUS_CHOICES = (
         ('in_progress', 'In Progress'),
+        ('grading', 'Grading'),
         ('completed', 'Completed'),
         ('timeout', 'Timeout'),
     )
 
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='attempts')
+    snapshot = models.ForeignKey(
+        TestSnapshot, on_delete=models.SET_NULL, null=True, blank=True, related_name='attempts'
+    )  # the test paper the attempt was started on
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
     score = models.IntegerField(null=True, blank=True)
@@ -154,6 +259,18 @@ class TestAttempt(models.Model):
 
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['test', 'student', '-started_at', '-id'], name='attempt_test_student_idx'),
+            models.Index(fields=['status', 'started_at'], name='attempt_status_started_idx'),
+        ]
+        constraints = [
+            # At most one active attempt per student and test
+            models.UniqueConstraint(
+                fields=['test', 'student'],
+                condition=models.Q(status='in_progress'),
+                name='unique_active_attempt',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.test.title}"
@@ -165,6 +282,8 @@ class QuestionAttempt(models.Model):
     code_submission = models.TextField(null=True, blank=True)
     points_earned = models.IntegerField(default=0)
     is_correct = models.BooleanField(default=False)
+    answer_sequence = models.PositiveIntegerField(default=0)  # of the last autosave applied
+    grading_pending = models.BooleanField(default=False)  # code submission queued for the sandbox
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -176,6 +295,11 @@ class ChoiceAttempt(models.Model):
     is_selected = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question_attempt', 'choice'], name='unique_choice_attempt'),
+        ]
+
     def __str__(self):
         return f"{self.question_attempt.test_attempt.student.get_full_name()} - {self.choice.text[:50]}"
 
@@ -187,9 +311,16 @@ class Certificate(models.Model):
     certificate_id = models.CharField(max_length=50, unique=True)
     grade = models.CharField(max_length=2)  # A, B, C, etc.
     is_valid = models.BooleanField(default=True)
+    document = models.FileField(upload_to='certificates/', blank=True)  # rendered PDF
+    image = models.FileField(upload_to='certificates/', blank=True)  # rendered PNG
+    rendering_started_at = models.DateTimeField(null=True, blank=True)  # render claimed, see courses.completion
 
     class Meta:
         ordering = ['-issued_at']
+        constraints = [
+            # The attempt is the idempotency key, a retried issue finds the existing one
+            models.UniqueConstraint(fields=['test_attempt'], name='unique_attempt_certificate'),
+        ]
 
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.course.title}"
@@ -209,6 +340,7 @@ class Achievement(models.Model):
     earned_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     class Meta:
         ordering = ['-earned_at']
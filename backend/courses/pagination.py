@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+class KeysetPagination(CursorPagination):
+    # Cursor pages seek on the ordering index, so deep pages cost the same as the first
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+class CoursePagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Ranked search results page by relevance
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        if request.query_params.get('ordering') == 'popular':
+            return ('-enrollment_count', '-id')
+        return super().get_ordering(request, queryset, view)
+
+class EnrollmentPagination(KeysetPagination):
+    ordering = ('-enrolled_at', '-id')
+
+class TestAttemptPagination(KeysetPagination):
+    ordering = ('-started_at', '-id')
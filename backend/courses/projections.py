@@ -0,0 +1,116 @@
+from collections import defaultdict
+from types import SimpleNamespace
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+class UnsupportedField(Exception):
+    pass
+
+class Projection:
+    """
+    Renders the representation of a bound serializer straight from
+    ``.values()`` rows. Each field is compiled once into a converter that
+    calls the field's own ``to_representation``, so the output matches the
+    serializer while skipping model instances and per-field attribute lookup.
+    Nested serializers are loaded with one extra ``.values()`` query per level.
+    Raises ``UnsupportedField`` for fields it cannot compile, callers then fall
+    back to the serializer.
+    """
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.columns = {self.model._meta.pk.attname}
+        self.steps = []
+        self.nested = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            self.steps.append(self._compile(name, field))
+
+    def _compile(self, name, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            return name, None, lambda row: field.to_representation(SimpleNamespace(**row))
+
+        if isinstance(field, serializers.BaseSerializer):
+            return self._compile_nested(name, field)
+
+        if '.' in field.source:
+            raise UnsupportedField(name)
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise UnsupportedField(name)
+        if model_field.is_relation:
+            raise UnsupportedField(name)
+
+        column = model_field.attname
+        self.columns.add(column)
+        if isinstance(model_field, models.FileField):
+            def convert(value):
+                return field.to_representation(model_field.attr_class(None, model_field, value))
+        else:
+            convert = field.to_representation
+        return name, column, convert
+
+    def _compile_nested(self, name, field):
+        many = isinstance(field, serializers.ListSerializer)
+        child = field.child if many else field
+        try:
+            relation = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise UnsupportedField(name)
+
+        projection = Projection(child)
+        if many and relation.one_to_many:
+            # Reverse foreign key: children point back at our primary key
+            link = relation.field.attname
+            projection.columns.add(link)
+            self.nested.append((name, projection, link, self.model._meta.pk.attname, True))
+        elif not many and (relation.many_to_one or relation.one_to_one) and relation.concrete:
+            link = projection.model._meta.pk.attname
+            self.columns.add(relation.attname)
+            self.nested.append((name, projection, link, relation.attname, False))
+        else:
+            raise UnsupportedField(name)
+        return name, None, None
+
+    def values(self, queryset, *extra):
+        columns = list(self.columns) + [column for column in extra if column not in self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def render(self, rows):
+        rows = list(rows)
+        related = {}
+        for name, projection, link, key, many in self.nested:
+            keys = {row[key] for row in rows if row[key] is not None}
+            children = projection.render_rows(
+                projection.model._default_manager.filter(**{f'{link}__in': keys})
+            )
+            if many:
+                grouped = defaultdict(list)
+                for child_row, data in children:
+                    grouped[child_row[link]].append(data)
+                related[name] = (key, grouped, [])
+            else:
+                related[name] = (key, {child_row[link]: data for child_row, data in children}, None)
+
+        output = []
+        for row in rows:
+            item = {}
+            for name, column, convert in self.steps:
+                if name in related:
+                    key, lookup, default = related[name]
+                    item[name] = lookup.get(row[key], default)
+                elif column is None:
+                    item[name] = convert(row)
+                else:
+                    value = row[column]
+                    item[name] = None if value is None else convert(value)
+            output.append(item)
+        return output
+
+    def render_rows(self, queryset):
+        rows = list(self.values(queryset))
+        return zip(rows, self.render(rows))
@@ -0,0 +1,15 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+class FastJSONRenderer(JSONRenderer):
+    # Byte-for-byte the same output as JSONRenderer for compact, unicode JSON
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
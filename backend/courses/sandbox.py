@@ -0,0 +1,132 @@
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .workers import get_pool as get_worker_pool
+
+logger = logging.getLogger(__name__)
+
+# The only host paths a submission sees, all read-only: the system libraries
+# and the Python installation. Nothing of the project, /etc or /home.
+SYSTEM_PATHS = ('/usr', '/bin', '/lib', '/lib64')
+SANDBOX_DIR = '/sandbox'
+
+# Applies the limits inside the child before the submission runs in the same
+# interpreter (-I -S: no environment, user or site-packages imports)
+BOOTSTRAP = """
+import resource, runpy, sys
+cpu, memory, output = (int(value) for value in sys.argv[1:4])
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+resource.setrlimit(resource.RLIMIT_FSIZE, (output, output))
+resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+sys.argv = ['submission.py']
+runpy.run_path('submission.py', run_name='__main__')
+"""
+
+def _normalize(output):
+    return '\n'.join(line.rstrip() for line in output.strip().splitlines())
+
+def sandbox_command(workdir, argv):
+    """
+    ``argv`` wrapped in bubblewrap: new user, PID, IPC, UTS, cgroup and
+    network namespaces (no network at all), the sandbox uid and gid, no
+    capabilities, an empty environment and a root holding only the system
+    paths, the interpreter, a private /tmp and ``workdir`` read-only at
+    /sandbox. A server running as root drops to the sandbox user first, so
+    the submission is never root outside its namespace either.
+    """
+    uid, gid = str(settings.CODE_GRADING_SANDBOX_UID), str(settings.CODE_GRADING_SANDBOX_GID)
+    command = [
+        settings.CODE_GRADING_BWRAP,
+        '--unshare-all', '--unshare-user', '--die-with-parent', '--new-session',
+        '--uid', uid, '--gid', gid, '--cap-drop', 'ALL',
+        '--clearenv', '--setenv', 'PYTHONIOENCODING', 'utf-8',
+        '--proc', '/proc', '--dev', '/dev', '--tmpfs', '/tmp',
+    ]
+    prefix = os.path.realpath(sys.base_prefix)
+    for path in SYSTEM_PATHS:
+        command += ['--ro-bind-try', path, path]
+    if not prefix.startswith('/usr/'):
+        command += ['--ro-bind', prefix, prefix]
+    command += ['--ro-bind', workdir, SANDBOX_DIR, '--chdir', SANDBOX_DIR, '--', *argv]
+    if os.geteuid() == 0:
+        command = ['setpriv', f'--reuid={uid}', f'--regid={gid}', '--clear-groups', '--', *command]
+    return command
+
+def _isolated():
+    # Fails closed: without bubblewrap submissions stay pending rather than
+    # run with the server's own files and network
+    if shutil.which(settings.CODE_GRADING_BWRAP):
+        return True
+    if settings.CODE_GRADING_ALLOW_UNISOLATED:
+        logger.warning(f"{settings.CODE_GRADING_BWRAP} not found, running a code submission WITHOUT isolation")
+        return False
+    raise ImproperlyConfigured(
+        f"Grading code submissions requires bubblewrap ({settings.CODE_GRADING_BWRAP} was not found)"
+    )
+
+def _run_case(workdir, case_input, isolated):
+    argv = [
+        os.path.realpath(sys.executable), '-I', '-S', '-c', BOOTSTRAP,
+        str(settings.CODE_GRADING_CPU_SECONDS),
+        str(settings.CODE_GRADING_MEMORY_MB * 1024 * 1024),
+        str(settings.CODE_GRADING_OUTPUT_KB * 1024),
+    ]
+    # stdout goes to a file so RLIMIT_FSIZE caps how much a submission can print
+    stdout_path = os.path.join(workdir, 'stdout')
+    with open(stdout_path, 'wb') as stdout:
+        process = subprocess.Popen(
+            sandbox_command(workdir, argv) if isolated else argv,
+            stdin=subprocess.PIPE,
+            stdout=stdout,
+            stderr=subprocess.DEVNULL,
+            cwd=workdir,
+            env={'PYTHONIOENCODING': 'utf-8'},
+            start_new_session=True,
+        )
+        try:
+            process.communicate(case_input.encode(), timeout=settings.CODE_GRADING_WALL_SECONDS)
+        except subprocess.TimeoutExpired:
+            # Kill the whole session, not just the interpreter
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            return None
+    if process.returncode != 0:
+        return None
+    with open(stdout_path, encoding='utf-8', errors='replace') as output:
+        return output.read()
+
+def run_submission(source, cases):
+    """
+    Run a Python submission once per (input, expected_output) case in a fresh
+    subprocess isolated by sandbox_command() and limited in CPU time,
+    memory, output size and wall clock time. True when every case prints the
+    expected output, ignoring trailing whitespace; without any case the
+    submission cannot be checked and is not passed. Raises
+    ImproperlyConfigured when bubblewrap is missing, unless
+    CODE_GRADING_ALLOW_UNISOLATED is set for development.
+    """
+    if not cases:
+        return False
+    isolated = _isolated()
+    with tempfile.TemporaryDirectory(prefix='sandbox-') as workdir:
+        with open(os.path.join(workdir, 'submission.py'), 'w', encoding='utf-8') as submission:
+            submission.write(source)
+        if isolated and os.geteuid() == 0:
+            # Readable by the sandbox user, which bwrap runs as
+            os.chown(workdir, settings.CODE_GRADING_SANDBOX_UID, settings.CODE_GRADING_SANDBOX_GID)
+        for case_input, expected_output in cases:
+            output = _run_case(workdir, case_input, isolated)
+            if output is None or _normalize(output) != _normalize(expected_output):
+                return False
+    return True
+
+def get_pool():
+    return get_worker_pool('sandbox', settings.CODE_GRADING_WORKERS, settings.CODE_GRADING_QUEUE_SIZE)
@@ -0,0 +1,36 @@
+import re
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+from .models import Course, Module, Video
+
+# Course content mixes Uzbek, Russian and English, so no language stemming
+SEARCH_CONFIG = 'simple'
+
+def course_search_vector():
+    module_titles = Module.objects.filter(course=OuterRef('pk')).values('course').annotate(
+        titles=StringAgg('title', delimiter=' ')
+    ).values('titles')
+    video_titles = Video.objects.filter(module__course=OuterRef('pk')).values('module__course').annotate(
+        titles=StringAgg('title', delimiter=' ')
+    ).values('titles')
+
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(module_titles), Value(''), output_field=TextField()), weight='C', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(video_titles), Value(''), output_field=TextField()), weight='D', config=SEARCH_CONFIG)
+    )
+
+def update_search_vectors(course_ids):
+    # One UPDATE for the whole batch, the module/video titles are aggregated in SQL
+    return Course.objects.filter(pk__in=course_ids).update(search_vector=course_search_vector())
+
+def build_search_query(text):
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    # The last word is matched as a prefix for type-ahead
+    terms = words[:-1] + [f"{words[-1]}:*"]
+    return SearchQuery(' & '.join(terms), search_type='raw', config=SEARCH_CONFIG)
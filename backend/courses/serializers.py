@@ -3,7 +3,45 @@ from .models import (
     Course, Module, Video, Enrollment, Test, Question, Choice,
     TestAttempt, QuestionAttempt, ChoiceAttempt, Certificate, Achievement
 )
-from users.serializers import UserSerializer
+from users.serializers import UserSerializer, InstructorSerializer
+from .answer_keys import get_answer_key
+from .cache import get_enrolled_course_ids
+
+def split_query_param(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+class SparseFieldsetMixin:
+    """
+    Lets clients shape the top-level representation from the query string:
+    ``?fields=id,title`` keeps only the listed fields and ``?expand=modules``
+    opts into fields listed in ``Meta.expandable_fields``, which are left out
+    by default. Nested uses of the serializer always drop expandable fields.
+    """
+
+    @classmethod
+    def get_requested_fields(cls, request=None):
+        expandable = getattr(cls.Meta, 'expandable_fields', [])
+        params = request.query_params if request is not None else {}
+        expand = split_query_param(params.get('expand'))
+        only = split_query_param(params.get('fields'))
+
+        fields = [name for name in cls.Meta.fields if name not in expandable or name in expand]
+        if only:
+            fields = [name for name in fields if name in only]
+        return fields
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self._is_top_level():
+            requested = self.get_requested_fields(self.context.get('request'))
+        else:
+            requested = self.get_requested_fields()
+        return {name: field for name, field in fields.items() if name in requested}
+
+    def _is_top_level(self):
+        if self.parent is None:
+            return True
+        return isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
 
 class VideoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,8 +55,37 @@ class ModuleSerializer(serializers.ModelSerializer):
         model = Module
         fields = ['id', 'title', 'description', 'order', 'videos']
 
-class CourseSerializer(serializers.ModelSerializer):
-    instructor = UserSerializer(read_only=True)
+class CurriculumItemMixin:
+    # Existing items (with an id) may omit fields they keep, new items need them all
+    def validate(self, attrs):
+        if 'id' not in attrs:
+            missing = [name for name in self.Meta.extra_kwargs if name not in attrs]
+            if missing:
+                raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+        return attrs
+
+class CurriculumVideoSerializer(CurriculumItemMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = Video
+        fields = ['id', 'title', 'description', 'video_url', 'duration']
+        extra_kwargs = {name: {'required': False} for name in fields[1:]}
+
+class CurriculumModuleSerializer(CurriculumItemMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+    videos = CurriculumVideoSerializer(many=True, required=False)
+
+    class Meta:
+        model = Module
+        fields = ['id', 'title', 'description', 'videos']
+        extra_kwargs = {'title': {'required': False}, 'description': {'required': False}}
+
+class CurriculumSerializer(serializers.Serializer):
+    modules = CurriculumModuleSerializer(many=True)
+
+class CourseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    instructor = InstructorSerializer(read_only=True)
     modules = ModuleSerializer(many=True, read_only=True)
     is_enrolled = serializers.SerializerMethodField()
 
@@ -27,15 +94,31 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'image', 'price', 'duration',
             'instructor', 'level', 'is_paid', 'created_at', 'updated_at',
+            'enrollment_count', 'module_count', 'video_count', 'total_video_duration',
             'modules', 'is_enrolled'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
     def get_is_enrolled(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.enrolled_students.filter(id=request.user.id).exists()
-        return False
+        enrolled_course_ids = self.context.get('enrolled_course_ids')
+        if enrolled_course_ids is None:
+            request = self.context.get('request')
+            if not request:
+                return False
+            # Looked up once, then shared by every course in this serialization
+            enrolled_course_ids = get_enrolled_course_ids(request.user)
+            self.context['enrolled_course_ids'] = enrolled_course_ids
+        return obj.id in enrolled_course_ids
+
+class CourseSummarySerializer(CourseSerializer):
+    class Meta(CourseSerializer.Meta):
+        fields = [
+            'id', 'title', 'description', 'image', 'price', 'duration', 'instructor',
+            'level', 'is_paid', 'created_at', 'enrollment_count',
+            'module_count', 'video_count', 'total_video_duration', 'is_enrolled',
+            'modules'
+        ]
+        expandable_fields = ['modules']
 
 class CourseCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -46,8 +129,8 @@ class CourseCreateSerializer(serializers.ModelSerializer):
         validated_data['instructor'] = self.context['request'].user
         return super().create(validated_data)
 
-class EnrollmentSerializer(serializers.ModelSerializer):
-    course = CourseSerializer(read_only=True)
+class EnrollmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    course = CourseSummarySerializer(read_only=True)
     student = UserSerializer(read_only=True)
 
     class Meta:
@@ -91,7 +174,7 @@ class TestSerializer(serializers.ModelSerializer):
         read_only_fields = ['course']
 
     def get_total_points(self, obj):
-        return sum(question.points for question in obj.questions.all())
+        return get_answer_key(obj.pk).total_points
 
 class ChoiceAttemptSerializer(serializers.ModelSerializer):
     class Meta:
@@ -105,10 +188,26 @@ class QuestionAttemptSerializer(serializers.ModelSerializer):
         model = QuestionAttempt
         fields = [
             'id', 'question', 'answer_text', 'code_submission',
-            'points_earned', 'is_correct', 'choice_attempts'
+            'points_earned', 'is_correct', 'answer_sequence', 'choice_attempts'
         ]
         read_only_fields = ['test_attempt']
 
+class AnswerSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    sequence = serializers.IntegerField(min_value=1)
+    choices = serializers.ListField(child=serializers.IntegerField(), required=False)
+    answer_text = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    code_submission = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+class AnswerBatchSerializer(serializers.Serializer):
+    answers = AnswerSerializer(many=True, max_length=500)
+
+    def validate_answers(self, answers):
+        question_ids = [answer['question'] for answer in answers]
+        if len(question_ids) != len(set(question_ids)):
+            raise serializers.ValidationError('Each question may only appear once')
+        return answers
+
 class TestAttemptSerializer(serializers.ModelSerializer):
     question_attempts = QuestionAttemptSerializer(many=True, read_only=True)
     student_name = serializers.SerializerMethodField()
@@ -117,11 +216,11 @@ class TestAttemptSerializer(serializers.ModelSerializer):
     class Meta:
         model = TestAttempt
         fields = [
-            'id', 'test', 'student', 'student_name', 'course_title',
+            'id', 'test', 'snapshot', 'student', 'student_name', 'course_title',
             'status', 'score', 'started_at', 'completed_at',
             'time_taken', 'question_attempts'
         ]
-        read_only_fields = ['student']
+        read_only_fields = ['student', 'snapshot']
 
     def get_student_name(self, obj):
         return obj.student.get_full_name()
@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_course_version, bump_enrollment_count, bump_test_version, forget_enrolled_course_ids
+from .models import Choice, Course, Enrollment, Module, Question, Test, Video
+from .search import update_search_vectors
+from .stats import adjust_course_stats, refresh_course_stats
+
+def _course_changed(course_id):
+    if course_id is not None:
+        update_search_vectors([course_id])
+    bump_course_version(course_id)
+
+def _bump_on_commit(course_id):
+    transaction.on_commit(lambda: _course_changed(course_id))
+
+def _video_course_id(module_id):
+    return Module.objects.filter(pk=module_id).values_list('course_id', flat=True).first()
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    _bump_on_commit(instance.pk)
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance, created, **kwargs):
+    if created:
+        adjust_course_stats(instance.course_id, module_count=1)
+    _bump_on_commit(instance.course_id)
+
+@receiver(post_delete, sender=Module)
+def module_deleted(sender, instance, **kwargs):
+    adjust_course_stats(instance.course_id, module_count=-1)
+    _bump_on_commit(instance.course_id)
+
+@receiver(pre_save, sender=Video)
+def video_saving(sender, instance, **kwargs):
+    # Remember the previous course so a video moved between courses updates both
+    instance._previous_course_id = None
+    if instance.pk:
+        instance._previous_course_id = Video.objects.filter(pk=instance.pk).values_list(
+            'module__course_id', flat=True
+        ).first()
+
+@receiver(post_save, sender=Video)
+def video_saved(sender, instance, created, **kwargs):
+    course_id = _video_course_id(instance.module_id)
+    if created:
+        adjust_course_stats(course_id, video_count=1, total_video_duration=instance.duration)
+    else:
+        course_ids = {course_id, instance._previous_course_id} - {None}
+        refresh_course_stats(course_ids)
+        if instance._previous_course_id not in (None, course_id):
+            _bump_on_commit(instance._previous_course_id)
+    _bump_on_commit(course_id)
+
+@receiver(post_delete, sender=Video)
+def video_deleted(sender, instance, **kwargs):
+    course_id = _video_course_id(instance.module_id)
+    adjust_course_stats(course_id, video_count=-1, total_video_duration=-instance.duration)
+    _bump_on_commit(course_id)
+
+def _enrollment_changed_on_commit(enrollment):
+    course_id, student_id = enrollment.course_id, enrollment.student_id
+    def changed():
+        bump_enrollment_count(course_id)
+        forget_enrolled_course_ids(student_id)
+    transaction.on_commit(changed)
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, **kwargs):
+    if created:
+        adjust_course_stats(instance.course_id, enrollment_count=1)
+        _enrollment_changed_on_commit(instance)
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    adjust_course_stats(instance.course_id, enrollment_count=-1)
+    _enrollment_changed_on_commit(instance)
+
+def _bump_test_on_commit(test_id):
+    transaction.on_commit(lambda: bump_test_version(test_id))
+
+@receiver(post_save, sender=Test)
+def test_saved(sender, instance, **kwargs):
+    # Title, description and limits are part of the test paper snapshot
+    _bump_test_on_commit(instance.pk)
+
+@receiver(pre_save, sender=Question)
+def question_saving(sender, instance, **kwargs):
+    # A question moved to another test changes both answer keys
+    instance._previous_test_id = None
+    if instance.pk:
+        instance._previous_test_id = Question.objects.filter(pk=instance.pk).values_list(
+            'test_id', flat=True
+        ).first()
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    if instance._previous_test_id not in (None, instance.test_id):
+        _bump_test_on_commit(instance._previous_test_id)
+    _bump_test_on_commit(instance.test_id)
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    _bump_test_on_commit(instance.test_id)
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    test_id = Question.objects.filter(pk=instance.question_id).values_list('test_id', flat=True).first()
+    _bump_test_on_commit(test_id)
@@ -0,0 +1,80 @@
+import hashlib
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from .cache import get_version, test_version_key
+from .models import Test, TestSnapshot
+from .serializers import TestSerializer
+
+def build_test_paper(test_id):
+    # The student-facing test as plain JSON data; choices never carry is_correct
+    test = Test.objects.prefetch_related('questions__choices').get(pk=test_id)
+    return orjson.loads(orjson.dumps(TestSerializer(test).data))
+
+def _cached(snapshot):
+    return {'id': snapshot.id, 'version': snapshot.version, 'checksum': snapshot.checksum, 'payload': snapshot.payload}
+
+def publish_snapshot(test_id):
+    """
+    Serialize the test paper and store it as the next snapshot version, or
+    return the latest snapshot when the paper has not changed since.
+    Snapshots are never modified once written.
+    """
+    payload = build_test_paper(test_id)
+    # A save that changed nothing but the timestamps is not a new version
+    content = {key: value for key, value in payload.items() if key not in ('created_at', 'updated_at')}
+    checksum = hashlib.sha1(orjson.dumps(content)).hexdigest()
+    latest = TestSnapshot.objects.filter(test_id=test_id).order_by('-version').first()
+    if latest is not None and latest.checksum == checksum:
+        return latest
+
+    version = latest.version + 1 if latest is not None else 1
+    try:
+        with transaction.atomic():
+            return TestSnapshot.objects.create(
+                test_id=test_id,
+                version=version,
+                checksum=checksum,
+                payload={**payload, 'snapshot': version}
+            )
+    except IntegrityError:
+        # Published concurrently by another request
+        return TestSnapshot.objects.get(test_id=test_id, version=version)
+
+def current_snapshot_cache_key(test_id):
+    return f"test_snapshot_{test_id}_{get_version(test_version_key(test_id))}"
+
+def snapshot_cache_key(snapshot_id):
+    return f"test_snapshot_id_{snapshot_id}"
+
+def get_current_snapshots(test_ids):
+    """
+    {test_id: snapshot} of the current test papers, read from the cache. A
+    test edited since its last snapshot has a new test version, so the first
+    read after the edit publishes the next snapshot.
+    """
+    cache_keys = {current_snapshot_cache_key(test_id): test_id for test_id in set(test_ids)}
+    cached = cache.get_many(cache_keys)
+    snapshots = {cache_keys[key]: snapshot for key, snapshot in cached.items()}
+
+    published = {}
+    for key, test_id in cache_keys.items():
+        if key not in cached:
+            snapshot = _cached(publish_snapshot(test_id))
+            snapshots[test_id] = published[key] = published[snapshot_cache_key(snapshot['id'])] = snapshot
+    if published:
+        cache.set_many(published, settings.TEST_SNAPSHOT_CACHE_TIMEOUT)
+    return snapshots
+
+def get_current_snapshot(test_id):
+    return get_current_snapshots([test_id])[test_id]
+
+def get_snapshot(snapshot_id):
+    # A pinned snapshot never changes, so its cache entry needs no version
+    key = snapshot_cache_key(snapshot_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _cached(TestSnapshot.objects.get(pk=snapshot_id))
+        cache.set(key, snapshot, settings.TEST_SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
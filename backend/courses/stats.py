@@ -0,0 +1,47 @@
+from datetime import timedelta
+from django.db.models import Count, DurationField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Course, Enrollment, Module, Video
+
+ZERO = {
+    'enrollment_count': 0,
+    'module_count': 0,
+    'video_count': 0,
+    'total_video_duration': timedelta(0),
+}
+
+def _per_course(queryset, course_field, aggregate):
+    return Subquery(
+        queryset.filter(**{course_field: OuterRef('pk')}).values(course_field).annotate(
+            value=aggregate
+        ).values('value')
+    )
+
+def refresh_course_stats(course_ids):
+    # Recompute every counter from the source rows in one UPDATE
+    return Course.objects.filter(pk__in=course_ids).update(
+        enrollment_count=Coalesce(
+            _per_course(Enrollment.objects.all(), 'course', Count('pk')), 0, output_field=IntegerField()
+        ),
+        module_count=Coalesce(
+            _per_course(Module.objects.all(), 'course', Count('pk')), 0, output_field=IntegerField()
+        ),
+        video_count=Coalesce(
+            _per_course(Video.objects.all(), 'module__course', Count('pk')), 0, output_field=IntegerField()
+        ),
+        total_video_duration=Coalesce(
+            _per_course(Video.objects.all(), 'module__course', Sum('duration')),
+            Value(timedelta(0)),
+            output_field=DurationField()
+        ),
+    )
+
+def adjust_course_stats(course_id, **deltas):
+    # Incremental update for the hot write paths, no read of the source rows.
+    # Clamped at zero so rows that predate a rebuild cannot go negative.
+    if course_id is None:
+        return 0
+    return Course.objects.filter(pk=course_id).update(**{
+        field: Greatest(F(field) + delta, Value(ZERO[field], output_field=Course._meta.get_field(field)))
+        for field, delta in deltas.items()
+    })
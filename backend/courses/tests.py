@@ -0,0 +1,767 @@
+import pickle
+import random
+import shutil
+import threading
+from array import array
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from payments.models import Payment
+from users.models import User
+from .analytics import rebuild_item_stats
+from .answer_keys import AnswerKey, answer_key_cache_key, compile_answer_keys, get_answer_key
+from .cache import enrolled_courses_key, get_enrolled_course_ids
+from .completion import claim_render, issue_awards
+from .grading import grade_attempts
+from .matching import compile_accepted_answers, match_text_answer, normalize_answer, within_edit_distance
+from .expiry import expire_attempts
+from .models import (
+    Certificate, Choice, ChoiceAttempt, CodeTestCase, Course, Enrollment, Module,
+    Question, QuestionAttempt, QuestionStats, Test, TestAttempt, Video
+)
+from .sandbox import run_submission, sandbox_command
+
+def create_courses(instructor, count, modules=2, videos=2):
+    courses = []
+    for i in range(count):
+        course = Course.objects.create(
+            title=f'Course {i}',
+            description=f'About course {i}',
+            image='courses/course.png',
+            price='10.00',
+            duration=timedelta(hours=2),
+            instructor=instructor,
+            level='beginner'
+        )
+        for m in range(modules):
+            module = Module.objects.create(course=course, title=f'Module {m}', description='Module', order=m)
+            for v in range(videos):
+                Video.objects.create(
+                    module=module,
+                    title=f'Video {v}',
+                    description='Video',
+                    video_url='https://example.com/video',
+                    duration=timedelta(minutes=5),
+                    order=v
+                )
+        courses.append(course)
+    return courses
+
+class CourseTestCase(TestCase):
+    """An instructor with one course of two modules, and a signed-in student."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', 'instructor@example.com', 'password', user_type='instructor')
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password')
+        cls.course = create_courses(cls.instructor, 1)[0]
+
+    def setUp(self):
+        # Cached payloads and snapshots would outlive the rolled back rows they were built from
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+class CourseListQueryTests(CourseTestCase):
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_do_not_grow_with_courses(self):
+        for url in ('/api/courses/courses/', '/api/courses/courses/?expand=modules'):
+            with self.subTest(url=url):
+                Course.objects.all().delete()
+                for course in create_courses(self.instructor, 2):
+                    Enrollment.objects.create(student=self.student, course=course)
+                expected = self.count_queries(url)
+
+                for course in create_courses(self.instructor, 8, modules=3, videos=4):
+                    Enrollment.objects.create(student=self.student, course=course)
+                cache.clear()
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.json()['results']), 10)
+                self.assertTrue(all(course['is_enrolled'] for course in response.json()['results']))
+
+class CursorPaginationTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i, course in enumerate([cls.course, *create_courses(cls.instructor, 4, modules=0)]):
+            enrollment = Enrollment.objects.create(student=cls.student, course=course)
+            Payment.objects.create(
+                enrollment=enrollment, amount='10.00', payment_method='click', card_type='uzcard', transaction_id=f'TX-{i}'
+            )
+        # Equal timestamps, so every page boundary has to break the tie on id
+        now = timezone.now()
+        Course.objects.update(created_at=now)
+        Enrollment.objects.update(enrolled_at=now)
+        Payment.objects.update(created_at=now)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            ids += [item['id'] for item in page['results']]
+            url = page['next']
+        return ids
+
+    def test_pages_walk_every_row_once(self):
+        for url, model in (
+            ('/api/courses/courses/?page_size=2', Course),
+            ('/api/courses/enrollments/?page_size=2', Enrollment),
+            ('/api/payments/payments/?page_size=2', Payment),
+        ):
+            with self.subTest(url=url):
+                expected = list(model.objects.order_by('-id').values_list('id', flat=True))
+                self.assertEqual(len(expected), 5)
+                self.assertEqual(self.walk(url), expected)
+
+class CourseSearchTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        with cls.captureOnCommitCallbacks(execute=True):
+            for title, description, module in (
+                ('Django for beginners', 'Web basics', None),
+                ('Web basics', 'Build apps with Django', None),
+                ('Python', 'Scripting', 'Django deployment'),
+                ('Cooking', 'Recipes', 'Knives'),
+            ):
+                course = create_courses(cls.instructor, 1, modules=0)[0]
+                course.title, course.description = title, description
+                course.save()
+                if module:
+                    Module.objects.create(course=course, title=module, description='Module', order=0)
+
+    def search(self, q, **params):
+        response = self.client.get('/api/courses/courses/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [course['title'] for course in response.json()['results']]
+
+    def test_title_outranks_description_outranks_modules(self):
+        expected = ['Django for beginners', 'Web basics', 'Python']
+        self.assertEqual(self.search('django'), expected)
+        self.assertEqual(self.search('DJAN'), expected)
+
+    def test_every_word_must_match(self):
+        self.assertEqual(sorted(self.search('web django')), ['Django for beginners', 'Web basics'])
+        self.assertEqual(self.search('django recipes'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_ranked_results_page_by_cursor(self):
+        titles, params = [], {'page_size': 1}
+        while True:
+            page = self.client.get('/api/courses/courses/', {'q': 'django', **params}).json()
+            titles += [course['title'] for course in page['results']]
+            if not page['next']:
+                break
+            params = {'page_size': 1, 'cursor': parse_qs(urlsplit(page['next']).query)['cursor'][0]}
+        self.assertEqual(titles, ['Django for beginners', 'Web basics', 'Python'])
+
+    def test_renamed_module_is_searchable(self):
+        self.assertNotIn('Cooking', self.search('django'))
+        module = Module.objects.get(title='Knives')
+        with self.captureOnCommitCallbacks(execute=True):
+            module.title = 'Django kitchen'
+            module.save()
+        self.assertIn('Cooking', self.search('django'))
+
+class CourseRepresentationTests(CourseTestCase):
+    def test_summary_includes_description(self):
+        course = self.client.get('/api/courses/courses/').json()['results'][0]
+        self.assertEqual(course['description'], 'About course 0')
+        self.assertNotIn('modules', course)
+
+    def test_enrollment_includes_student(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        enrollment = self.client.get('/api/courses/enrollments/').json()['results'][0]
+        self.assertEqual(enrollment['student']['id'], self.student.id)
+        self.assertEqual(enrollment['course']['description'], 'About course 0')
+
+    def test_instructor_is_a_public_profile(self):
+        client = APIClient()
+        for url in ('/api/courses/courses/', f'/api/courses/courses/{self.course.id}/'):
+            with self.subTest(url=url):
+                for fast in (False, True):
+                    cache.clear()
+                    with self.settings(FAST_READ_PATH=fast):
+                        data = client.get(url).json()
+                    instructor = data['results'][0]['instructor'] if 'results' in data else data['instructor']
+                    self.assertEqual(
+                        sorted(instructor), ['avatar', 'bio', 'first_name', 'id', 'last_name', 'username']
+                    )
+
+    def test_detail_cache_follows_course_id(self):
+        self.assertEqual(self.client.get(f'/api/courses/courses/0{self.course.id}/').json()['title'], 'Course 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Renamed'
+            self.course.save()
+        self.assertEqual(self.client.get(f'/api/courses/courses/0{self.course.id}/').json()['title'], 'Renamed')
+        self.assertEqual(self.client.get('/api/courses/courses/x1/').status_code, 404)
+
+class CourseStatsTests(CourseTestCase):
+    def test_save_keeps_concurrent_counter_updates(self):
+        course = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+        course.title = 'Renamed'
+        course.save()
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        response = client.patch(f'/api/courses/courses/{course.pk}/', {'price': '12.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        course.refresh_from_db()
+        self.assertEqual((course.title, course.enrollment_count, course.module_count), ('Renamed', 1, 2))
+
+    def test_enrollment_only_invalidates_popularity_pages(self):
+        client = APIClient()
+        urls = ('/api/courses/courses/', '/api/courses/courses/?ordering=popular')
+        etags = lambda: [client.get(url)['ETag'] for url in urls]
+
+        before = etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=self.student, course=self.course)
+        after = etags()
+        self.assertEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertEqual(client.get(urls[1]).json()['results'][0]['enrollment_count'], 1)
+
+class FastReadParityTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.instructor.first_name = 'Ünï '
+        cls.instructor.save()
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.course = create_courses(cls.instructor, 5, modules=3, videos=3)[0]
+            cls.course.title = 'Python   "quoted" 😀\x01'
+            cls.course.image = ''
+            cls.course.save()
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+
+    def fetch(self, url, fast):
+        cache.clear()
+        with self.settings(FAST_READ_PATH=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_fast_path_matches_serializers(self):
+        course = self.course
+        module = course.modules.first()
+        video = module.videos.first()
+        urls = [
+            '/api/courses/courses/',
+            '/api/courses/courses/?expand=modules',
+            '/api/courses/courses/?fields=id,title,is_enrolled',
+            '/api/courses/courses/?q=python',
+            '/api/courses/courses/?ordering=popular&page_size=2',
+            f'/api/courses/courses/{course.id}/',
+            f'/api/courses/courses/{course.id}/?fields=modules,image',
+            f'/api/courses/courses/{course.id}/modules/',
+            f'/api/courses/courses/{course.id}/modules/{module.id}/',
+            f'/api/courses/courses/{course.id}/modules/{module.id}/videos/',
+            f'/api/courses/courses/{course.id}/modules/{module.id}/videos/{video.id}/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.fetch(url, False), self.fetch(url, True))
+
+    def test_malformed_pks_are_not_found_on_both_paths(self):
+        module = self.course.modules.first()
+        for url in (
+            f'/api/courses/courses/{self.course.id}/modules/abc/',
+            f'/api/courses/courses/{self.course.id}/modules/{module.id}/videos/abc/',
+        ):
+            for fast in (False, True):
+                with self.subTest(url=url, fast=fast), self.settings(FAST_READ_PATH=fast):
+                    self.assertEqual(self.client.get(url).status_code, 404)
+
+class EnrolledCourseIdsTests(CourseTestCase):
+    def test_set_loaded_before_enrolling_is_not_served_after(self):
+        self.assertEqual(get_enrolled_course_ids(self.student), frozenset())
+        # A concurrent reader loaded the set before the enrollment committed...
+        stale_key = enrolled_courses_key(self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=self.student, course=self.course)
+        # ...and stores it only after
+        cache.set(stale_key, array('q').tobytes())
+        self.assertEqual(get_enrolled_course_ids(self.student), frozenset([self.course.id]))
+
+class CurriculumTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.instructor)
+
+    def test_non_numeric_course_id_is_not_found(self):
+        self.assertEqual(self.client.get('/api/courses/courses/abc/curriculum/').status_code, 404)
+        response = self.client.put('/api/courses/courses/abc/curriculum/', {'modules': []}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def put_counting_queries(self, course):
+        # Keeps the first module and its videos, removes the rest
+        kept = course.modules.order_by('order').first()
+        payload = {'modules': [{'id': kept.id, 'videos': [{'id': video.id} for video in kept.videos.all()]}]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api/courses/courses/{course.id}/curriculum/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        course.refresh_from_db()
+        self.assertEqual((course.module_count, course.video_count), (1, kept.videos.count()))
+        self.assertFalse(Video.objects.filter(module__course=course).exclude(module=kept).exists())
+        return len(queries)
+
+    def test_statements_do_not_grow_with_removed_items(self):
+        expected = self.put_counting_queries(self.course)
+        large = create_courses(self.instructor, 1, modules=6, videos=3)[0]
+        self.assertEqual(self.put_counting_queries(large), expected)
+
+class QueryPlanTests(TestCase):
+    def test_flags_the_query_that_loses_its_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Payment._meta.db_table)
+            for name, constraint in constraints.items():
+                if constraint['index'] and not constraint['unique'] and constraint['columns'] == ['payment_id']:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, 'payment by payment_id: sequential scan on payments_payment'):
+            call_command('check_query_plans', stdout=out)
+        # Every other hot query still plans an index scan
+        self.assertEqual(out.getvalue().count('ok   '), 14)
+        self.assertEqual(out.getvalue().count('FAIL '), 1)
+        self.assertFalse(Course.objects.exists())
+
+def create_test(course, questions, **kwargs):
+    test = Test.objects.create(course=course, title='Test', description='Test', **kwargs)
+    for i in range(questions):
+        question = Question.objects.create(test=test, question_type='single_choice', text=f'Question {i}', order=i)
+        Choice.objects.create(question=question, text='Right', is_correct=True)
+    return test
+
+class AttemptStartTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+
+    def start(self, test):
+        return self.client.post(f'/api/courses/courses/{self.course.id}/tests/{test.id}/attempts/')
+
+    def test_start_creates_every_question_attempt_in_fixed_queries(self):
+        small, large = create_test(self.course, 2), create_test(self.course, 40)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.start(small).status_code, 201)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            response = self.start(large)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(QuestionAttempt.objects.filter(test_attempt_id=response.json()['id']).count(), 40)
+
+    def test_one_attempt_in_progress_per_test(self):
+        test = create_test(self.course, 2)
+        self.assertEqual(self.start(test).status_code, 201)
+        response = self.start(test)
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'You already have an active attempt'}))
+        self.assertEqual(TestAttempt.objects.filter(test=test).count(), 1)
+        self.assertEqual(QuestionAttempt.objects.filter(test_attempt__test=test).count(), 2)
+
+    def test_students_not_enrolled_cannot_start(self):
+        test = create_test(create_courses(self.instructor, 1, modules=0)[0], 2)
+        self.assertEqual(self.client.post(
+            f'/api/courses/courses/{test.course_id}/tests/{test.id}/attempts/'
+        ).status_code, 404)
+
+class AttemptStartRaceTests(TransactionTestCase):
+    def test_concurrent_starts_create_one_attempt(self):
+        cache.clear()
+        instructor = User.objects.create_user('instructor', 'instructor@example.com', 'password', user_type='instructor')
+        student = User.objects.create_user('student', 'student@example.com', 'password')
+        course = create_courses(instructor, 1, modules=0)[0]
+        Enrollment.objects.create(student=student, course=course)
+        test = create_test(course, 3)
+
+        barrier = threading.Barrier(2)
+        statuses = []
+        def start():
+            client = APIClient()
+            client.force_authenticate(student)
+            barrier.wait()
+            try:
+                statuses.append(client.post(f'/api/courses/courses/{course.id}/tests/{test.id}/attempts/').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=start) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(statuses), [201, 400])
+        self.assertEqual(QuestionAttempt.objects.filter(test_attempt__test=test).count(), 3)
+
+class GradingQueryTests(CourseTestCase):
+    def create_attempt(self, questions):
+        test = Test.objects.create(course=self.course, title='Test', description='Test')
+        created = Question.objects.bulk_create([
+            Question(test=test, question_type='multiple_choice', text=f'Question {i}', points=2, order=i)
+            for i in range(questions)
+        ])
+        choices = Choice.objects.bulk_create([
+            Choice(question=question, text=f'Choice {j}', is_correct=j == 0, order=j)
+            for question in created for j in range(3)
+        ])
+        attempt = TestAttempt.objects.create(test=test, student=self.student)
+        question_attempts = QuestionAttempt.objects.bulk_create([
+            QuestionAttempt(test_attempt=attempt, question=question) for question in created
+        ])
+        # Every other question answered correctly
+        ChoiceAttempt.objects.bulk_create([
+            ChoiceAttempt(question_attempt=question_attempt, choice=choices[i * 3 + i % 2], is_selected=True)
+            for i, question_attempt in enumerate(question_attempts)
+        ])
+        return attempt
+
+    def grade_counting_queries(self, attempt):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            results = grade_attempts([attempt])
+        return len(queries), results[attempt.pk]
+
+    def test_rollups_upsert_in_key_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            grade_attempts([self.create_attempt(3)])
+        upserts = [query['sql'] for query in queries if 'ON CONFLICT' in query['sql']]
+        self.assertEqual(len(upserts), 2)
+        self.assertIn('ORDER BY "courses_questionattempt"."question_id" ASC ON CONFLICT', upserts[0])
+        self.assertIn('ORDER BY "courses_choiceattempt"."choice_id" ASC ON CONFLICT', upserts[1])
+
+    def test_text_answers_are_graded_against_accepted_answers(self):
+        test = Test.objects.create(course=self.course, title='Test', description='Test')
+        checked = Question.objects.create(
+            test=test, question_type='text', text='Capital?', accepted_answers=['Tashkent'], max_edit_distance=1
+        )
+        unchecked = Question.objects.create(test=test, question_type='text', text='Opinion?')
+        # Questions without accepted answers are not checked
+        for answer, score in ((' tashkant ', 100), ('Samarkand', 50)):
+            attempt = TestAttempt.objects.create(test=test, student=self.student)
+            QuestionAttempt.objects.bulk_create([
+                QuestionAttempt(test_attempt=attempt, question=checked, answer_text=answer),
+                QuestionAttempt(test_attempt=attempt, question=unchecked, answer_text='Anything'),
+            ])
+            with self.subTest(answer=answer):
+                self.assertEqual(grade_attempts([attempt])[attempt.pk]['score'], score)
+
+    def test_analytics_for_the_course_instructor_only(self):
+        attempt = self.create_attempt(3)
+        grade_attempts([attempt])
+        url = f'/api/courses/courses/{self.course.id}/tests/{attempt.test_id}/analytics/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(self.instructor)
+        questions = self.client.get(url).json()['questions']
+        self.assertEqual([question['difficulty'] for question in questions], [1.0, 0.0, 1.0])
+        self.assertEqual(self.client.get(f'/api/courses/courses/{self.course.id}/tests/abc/analytics/').status_code, 404)
+
+    def test_queries_do_not_grow_with_questions(self):
+        expected, _ = self.grade_counting_queries(self.create_attempt(3))
+        count, result = self.grade_counting_queries(self.create_attempt(200))
+        self.assertEqual(count, expected)
+        self.assertEqual((result['score'], result['total_points'], result['earned_points']), (50, 400, 200))
+
+class AnswerKeyCacheTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.test = Test.objects.create(course=cls.course, title='Test', description='Test')
+        question = Question.objects.create(test=cls.test, question_type='single_choice', text='Question', points=3)
+        cls.choice = Choice.objects.create(question=question, text='Right', is_correct=True)
+
+    def test_compiled_once_then_served_from_cache(self):
+        with self.assertNumQueries(2):
+            answer_key = get_answer_key(self.test.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_answer_key(self.test.pk).questions, answer_key.questions)
+
+    def test_compiles_many_tests_in_two_queries(self):
+        tests = [create_test(self.course, 3) for _ in range(5)]
+        with self.assertNumQueries(2):
+            answer_keys = compile_answer_keys([test.pk for test in tests])
+        self.assertEqual([answer_keys[test.pk].total_points for test in tests], [3] * 5)
+
+    def test_edits_are_graded_against_a_new_key(self):
+        self.assertEqual(get_answer_key(self.test.pk).get(self.choice.question_id)[2], {self.choice.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Choice.objects.create(question_id=self.choice.question_id, text='Also right', is_correct=True)
+        self.assertEqual(get_answer_key(self.test.pk).get(self.choice.question_id)[2], {self.choice.pk, other.pk})
+        question = Question.objects.get(pk=self.choice.question_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.points = 5
+            question.save()
+        self.assertEqual(get_answer_key(self.test.pk).total_points, 5)
+
+    def test_round_trips_through_pickle(self):
+        answer_key = get_answer_key(self.test.pk)
+        restored = pickle.loads(pickle.dumps(answer_key))
+        self.assertEqual((restored.questions, restored.total_points), (answer_key.questions, 3))
+
+    def test_key_pickled_by_another_layout_is_compiled_again(self):
+        class OldAnswerKey:
+            def __reduce__(self):
+                return AnswerKey.__new__, (AnswerKey,), (7, {}, {})
+        cache.set(answer_key_cache_key(self.test.pk), OldAnswerKey())
+        with self.assertLogs('courses.answer_keys', 'WARNING'):
+            self.assertEqual(get_answer_key(self.test.pk).total_points, 3)
+        self.assertEqual(get_answer_key(self.test.pk).total_points, 3)
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+class TextMatchingTests(SimpleTestCase):
+    def test_normalization(self):
+        self.assertEqual(normalize_answer('  Hello,\tWORLD!! '), 'hello world')
+        self.assertEqual(normalize_answer('ＰＹＴＨＯＮ'), 'python')
+        self.assertEqual(normalize_answer('Straße'), normalize_answer('STRASSE'))
+        self.assertEqual(normalize_answer(None), '')
+
+    def test_banded_edit_distance_matches_full_levenshtein(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            a = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 7)))
+            b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 7)))
+            limit = rng.randint(0, 3)
+            with self.subTest(a=a, b=b, limit=limit):
+                self.assertEqual(within_edit_distance(a, b, limit), levenshtein(a, b) <= limit)
+
+    def test_matching(self):
+        exact = compile_accepted_answers(['Photosynthesis', 'photo-synthesis'], 0)
+        self.assertTrue(match_text_answer(exact, 'PHOTOSYNTHESIS.'))
+        self.assertTrue(match_text_answer(exact, 'photo synthesis'))
+        self.assertFalse(match_text_answer(exact, 'photosynthesys'))
+        self.assertFalse(match_text_answer(exact, '...'))
+
+        typos = compile_accepted_answers(['Photosynthesis'], 1)
+        self.assertTrue(match_text_answer(typos, 'photosynthesys'))
+        self.assertFalse(match_text_answer(typos, 'fotosynthesys'))
+        self.assertIsNone(compile_accepted_answers(['', '?!'], 1))
+
+class SandboxTests(SimpleTestCase):
+    cases = [('1 2\n', '3\n'), ('5 5', '10')]
+    adder = 'a, b = map(int, input().split())\nprint(a + b)\n'
+
+    @override_settings(CODE_GRADING_BWRAP='missing-bwrap', CODE_GRADING_ALLOW_UNISOLATED=False)
+    def test_refuses_to_run_without_bubblewrap(self):
+        with self.assertRaises(ImproperlyConfigured):
+            run_submission(self.adder, self.cases)
+
+    @override_settings(CODE_GRADING_BWRAP='missing-bwrap', CODE_GRADING_ALLOW_UNISOLATED=True)
+    def test_development_mode_runs_unisolated(self):
+        with self.assertLogs('courses.sandbox', 'WARNING'):
+            self.assertTrue(run_submission(self.adder, self.cases))
+        with self.assertLogs('courses.sandbox', 'WARNING'):
+            self.assertFalse(run_submission('while True: pass', self.cases))
+
+    def test_submission_without_cases_is_not_passed(self):
+        self.assertFalse(run_submission(self.adder, []))
+
+    def test_command_exposes_only_system_paths_and_workdir(self):
+        command = sandbox_command('/tmp/sandbox-work', ['python3'])
+        self.assertIn('--unshare-all', command)
+        self.assertEqual(command[command.index('--uid') + 1], str(settings.CODE_GRADING_SANDBOX_UID))
+        binds = [command[i + 1] for i, arg in enumerate(command) if arg in ('--bind', '--ro-bind', '--ro-bind-try')]
+        self.assertNotIn('--bind', command)
+        self.assertIn('/tmp/sandbox-work', binds)
+        self.assertFalse([path for path in binds if str(settings.BASE_DIR).startswith(path.rstrip('/') + '/')])
+
+    @skipUnless(shutil.which(settings.CODE_GRADING_BWRAP), 'bubblewrap is not installed')
+    def test_submission_cannot_reach_project_files_or_network(self):
+        self.assertTrue(run_submission(self.adder, self.cases))
+        settings_file = Path(settings.BASE_DIR) / 'shams_academy' / 'settings.py'
+        self.assertFalse(run_submission(f"open({str(settings_file)!r})\nprint(3)", self.cases[:1]))
+        self.assertFalse(run_submission(
+            "import socket\nsocket.create_connection(('127.0.0.1', 5432), timeout=1)\nprint(3)", self.cases[:1]
+        ))
+
+class TestPaperSnapshotTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.test = create_test(cls.course, 2)
+        cls.url = f'/api/courses/courses/{cls.course.id}/tests/{cls.test.id}/'
+
+    def paper(self, attempt_id, **headers):
+        return self.client.get(f'{self.url}attempts/{attempt_id}/paper/', headers=headers)
+
+    def test_attempts_keep_the_paper_they_started_on(self):
+        first = self.client.post(f'{self.url}attempts/').json()['id']
+        before = self.paper(first)
+        self.assertEqual((before.json()['snapshot'], len(before.json()['questions'])), (1, 2))
+
+        question = self.test.questions.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            question.text = 'Reworded'
+            question.save()
+            Question.objects.create(test=self.test, question_type='single_choice', text='Added', order=2)
+
+        # The attempt in progress still sees, and revalidates, its original paper
+        after = self.paper(first)
+        self.assertEqual(after.content, before.content)
+        self.assertEqual(self.paper(first, if_none_match=before['ETag']).status_code, 304)
+
+        current = self.client.get(self.url).json()
+        self.assertEqual((current['snapshot'], len(current['questions'])), (2, 3))
+        self.assertEqual(current['questions'][0]['text'], 'Reworded')
+
+        self.assertEqual(self.client.post(f'{self.url}attempts/{first}/submit/').status_code, 200)
+        second = self.client.post(f'{self.url}attempts/').json()['id']
+        self.assertEqual(self.paper(second).json(), current)
+        self.assertEqual(QuestionAttempt.objects.filter(test_attempt_id=second).count(), 3)
+
+    def test_malformed_ids_are_not_found(self):
+        self.assertEqual(self.client.get(f'/api/courses/courses/{self.course.id}/tests/abc/').status_code, 404)
+        self.assertEqual(self.paper('abc').status_code, 404)
+
+@override_settings(TEST_TIMEOUT_GRACE_SECONDS=60)
+class AttemptDeadlineTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.test = Test.objects.create(course=cls.course, title='Test', description='Test', time_limit=30)
+        cls.question = Question.objects.create(test=cls.test, question_type='single_choice', text='Question')
+        cls.choice = Choice.objects.create(question=cls.question, text='Right', is_correct=True)
+        cls.url = f'/api/courses/courses/{cls.course.id}/tests/{cls.test.id}/attempts/'
+
+    def start(self, minutes_ago):
+        attempt_id = self.client.post(self.url).json()['id']
+        TestAttempt.objects.filter(pk=attempt_id).update(started_at=timezone.now() - timedelta(minutes=minutes_ago))
+        return attempt_id
+
+    def save(self, attempt_id):
+        answers = [{'question': self.question.id, 'sequence': 1, 'choices': [self.choice.id]}]
+        return self.client.post(f'{self.url}{attempt_id}/answers/', {'answers': answers}, format='json')
+
+    def test_malformed_attempt_ids_are_not_found(self):
+        for method, action in (('post', 'submit'), ('post', 'answers')):
+            with self.subTest(action=action):
+                self.assertEqual(getattr(self.client, method)(f'{self.url}abc/{action}/').status_code, 404)
+
+    def test_answer_to_a_question_moved_away_is_rejected(self):
+        attempt_id = self.start(minutes_ago=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.test = Test.objects.create(course=self.course, title='Other', description='Other')
+            self.question.save()
+        response = self.save(attempt_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no longer part of this test', response.json()['answers'])
+
+    def test_saves_and_submit_within_grace_period(self):
+        attempt_id = self.start(minutes_ago=30.5)
+        self.assertEqual(self.save(attempt_id).status_code, 200)
+        response = self.client.post(f'{self.url}{attempt_id}/submit/')
+        self.assertEqual((response.status_code, response.json()['status'], response.json()['score']), (200, 'completed', 100))
+
+    def test_save_after_grace_period_times_out(self):
+        attempt_id = self.start(minutes_ago=32)
+        response = self.save(attempt_id)
+        self.assertEqual((response.status_code, response.json()['status']), (400, 'timeout'))
+        attempt = TestAttempt.objects.get(pk=attempt_id)
+        self.assertEqual((attempt.status, attempt.score), ('timeout', 0))
+
+    def test_submit_after_grace_period_times_out(self):
+        attempt_id = self.start(minutes_ago=32)
+        response = self.client.post(f'{self.url}{attempt_id}/submit/')
+        self.assertEqual((response.status_code, response.json()['status']), (400, 'timeout'))
+        self.assertEqual(TestAttempt.objects.get(pk=attempt_id).status, 'timeout')
+
+@override_settings(CODE_GRADING_ALLOW_UNISOLATED=True)
+class CodeGradingRecoveryTests(TransactionTestCase):
+    def test_swept_attempt_with_code_is_recovered_as_timeout(self):
+        cache.clear()
+        instructor = User.objects.create_user('instructor', 'instructor@example.com', 'password', user_type='instructor')
+        student = User.objects.create_user('student', 'student@example.com', 'password')
+        course = create_courses(instructor, 1, modules=0)[0]
+        test = Test.objects.create(course=course, title='Test', description='Test', time_limit=30)
+        question = Question.objects.create(test=test, question_type='code', text='Add', points=4)
+        CodeTestCase.objects.create(question=question, input='1 2\n', expected_output='3\n')
+        attempt = TestAttempt.objects.create(test=test, student=student)
+        TestAttempt.objects.filter(pk=attempt.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        QuestionAttempt.objects.create(test_attempt=attempt, question=question, code_submission=SandboxTests.adder)
+
+        # The sweeper's process goes away before its code jobs run
+        with mock.patch('courses.grading.enqueue_code_grading', return_value=[]):
+            self.assertEqual(expire_attempts(), 1)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.status, attempt.score), ('timeout', 0))
+        self.assertTrue(QuestionAttempt.objects.get(test_attempt=attempt).grading_pending)
+
+        out = StringIO()
+        call_command('grade_code_submissions', stdout=out)
+        self.assertIn('Graded 1 submissions', out.getvalue())
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.status, attempt.score), ('timeout', 100))
+        self.assertFalse(QuestionAttempt.objects.get(test_attempt=attempt).grading_pending)
+        self.assertEqual(QuestionStats.objects.get(question=question).attempts, 1)
+        self.assertFalse(Certificate.objects.exists())
+        # No longer pending, so a rebuild counts it too
+        rebuild_item_stats()
+        self.assertEqual(QuestionStats.objects.get(question=question).correct, 1)
+
+class CertificateRenderClaimTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        test = Test.objects.create(course=cls.course, title='Final', description='Final', is_final=True, passing_score=50)
+        cls.attempt = TestAttempt.objects.create(test=test, student=cls.student, status='completed', score=95)
+        cls.certificate = Certificate.objects.create(
+            student=cls.student, course=cls.course, test_attempt=cls.attempt, certificate_id='CERT-TEST', grade='A'
+        )
+        cls.url = f'/api/courses/certificates/{cls.certificate.pk}/download/'
+
+    @mock.patch('courses.views.enqueue_awards', return_value=[object()])
+    def test_polling_queues_one_render_per_claim(self, enqueue_awards):
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, 202)
+        enqueue_awards.assert_called_once_with([self.attempt.pk], render_claimed=True)
+
+        stale = timezone.now() - timedelta(seconds=settings.CERTIFICATE_RENDER_CLAIM_SECONDS + 1)
+        Certificate.objects.filter(pk=self.certificate.pk).update(rendering_started_at=stale)
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(enqueue_awards.call_count, 2)
+
+    @mock.patch('courses.views.enqueue_awards', return_value=[])
+    def test_claim_released_when_queue_is_full(self, enqueue_awards):
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertIsNone(Certificate.objects.get(pk=self.certificate.pk).rendering_started_at)
+
+    @mock.patch('courses.completion.render_certificate_files')
+    def test_workers_skip_a_claimed_render(self, render_certificate_files):
+        self.assertTrue(claim_render(self.certificate.pk))
+        issue_awards(self.attempt.pk)
+        render_certificate_files.assert_not_called()
+        issue_awards(self.attempt.pk, render_claimed=True)
+        render_certificate_files.assert_called_once()
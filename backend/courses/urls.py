@@ -7,12 +7,14 @@ from .views import (
     EnrollmentViewSet,
     TestViewSet,
     TestAttemptViewSet,
+    CertificateViewSet,
     AchievementViewSet
 )
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
 router.register(r'enrollments', EnrollmentViewSet, basename='enrollment')
+router.register(r'certificates', CertificateViewSet, basename='certificate')
 
 course_router = DefaultRouter()
 course_router.register(r'modules', ModuleViewSet, basename='module')
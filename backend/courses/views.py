@@ -1,47 +1,173 @@
-from rest_framework import generics, status, viewsets, permissions
+from rest_framework import generics, serializers, status, viewsets, permissions
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.contrib.postgres.search import SearchRank
+from django.db.models import F, FloatField, Prefetch
+from django.db.models.functions import Cast
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
+from django.utils.http import quote_etag
 from .models import (
-    Course, Module, Video, Enrollment, Test, Question, Choice,
-    TestAttempt, QuestionAttempt, ChoiceAttempt, Certificate, Achievement
+    Course, Module, Video, Enrollment, Test,
+    TestAttempt, QuestionAttempt, Certificate, Achievement
 )
+from .cache import (
+    course_detail_cache_key,
+    course_list_cache_key,
+    etag_matches,
+    get_enrolled_course_ids,
+    get_or_build,
+    make_etag,
+    merge_enrollment,
+)
+from .analytics import get_test_analytics
+from .answers import TIME_UP, save_answers
+from .completion import award_completion, claim_render, enqueue_awards, release_render
+from .curriculum import apply_curriculum, get_curriculum
+from .expiry import attempt_expired
+from .grading import grade_attempts
+from .pagination import CoursePagination, EnrollmentPagination, TestAttemptPagination
+from .projections import Projection, UnsupportedField
+from .renderers import FastJSONRenderer
+from .search import build_search_query
+from .snapshots import get_current_snapshot, get_current_snapshots, get_snapshot
 from .serializers import (
     CourseSerializer,
+    CourseSummarySerializer,
     CourseCreateSerializer,
+    CurriculumSerializer,
     ModuleSerializer,
     VideoSerializer,
     EnrollmentSerializer,
     EnrollmentCreateSerializer,
     TestSerializer,
-    QuestionSerializer,
-    ChoiceSerializer,
     TestAttemptSerializer,
-    QuestionAttemptSerializer,
-    ChoiceAttemptSerializer,
+    AnswerBatchSerializer,
     CertificateSerializer,
     AchievementSerializer
 )
 
+def course_id_or_404(pk):
+    # URL pks are strings; '01' and '1' must share cache keys and versions
+    if not pk.isdecimal():
+        raise Http404
+    return int(pk)
+
+def snapshot_response(request, snapshot):
+    # Snapshots are immutable, so the checksum is a strong validator
+    etag = quote_etag(snapshot['checksum'])
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(snapshot['payload'])
+    response['ETag'] = etag
+    return response
+
 class IsInstructorOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return True
         return request.user.is_authenticated and request.user.user_type == 'instructor'
 
-class CourseViewSet(viewsets.ModelViewSet):
+class FastReadMixin:
+    """
+    Opt-in fast path for list and retrieve (settings.FAST_READ_PATH): rows are
+    read with .values(), rendered by a Projection compiled from the serializer
+    and encoded with orjson. The JSON is identical to the serializer path,
+    which is still used for other formats and any field a Projection cannot
+    compile.
+    """
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if settings.FAST_READ_PATH:
+            renderers = [
+                FastJSONRenderer() if type(renderer) is JSONRenderer else renderer
+                for renderer in renderers
+            ]
+        return renderers
+
+    def get_projection(self):
+        if not settings.FAST_READ_PATH or self.request.accepted_renderer.format != 'json':
+            return None
+        try:
+            return Projection(self.get_serializer())
+        except UnsupportedField:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        projection = self.get_projection()
+        if projection is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = []
+        if self.paginator is not None and hasattr(self.paginator, 'get_ordering'):
+            ordering = [name.lstrip('-') for name in self.paginator.get_ordering(request, queryset, self)]
+        rows = projection.values(queryset, *ordering)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(projection.render(page))
+        return Response(projection.render(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        projection = self.get_projection()
+        if projection is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # DRF's get_object_or_404, which also turns a malformed pk into a 404
+        row = generics.get_object_or_404(
+            projection.values(queryset), **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, row)
+        return Response(projection.render([row])[0])
+
+class CourseViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsInstructorOrReadOnly]
     serializer_class = CourseSerializer
+    pagination_class = CoursePagination
+
+    def get_permissions(self):
+        # Any signed-in user may enroll, only instructors edit the catalog
+        if self.action == 'enroll':
+            return [permissions.IsAuthenticated()]
+        return super().get_permissions()
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CourseCreateSerializer
+        if self.action == 'list':
+            return CourseSummarySerializer
         return CourseSerializer
 
     def get_queryset(self):
-        queryset = Course.objects.all()
+        queryset = Course.objects.defer('search_vector')
+
+        # Only join and prefetch what the requested representation renders
+        if self.action in ['list', 'retrieve']:
+            fields = self.get_serializer_class().get_requested_fields(self.request)
+        elif self.action == 'enroll':
+            fields = ['id']
+        else:
+            fields = CourseSerializer.Meta.fields
+        if 'instructor' in fields:
+            queryset = queryset.select_related('instructor')
+        if 'modules' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('modules', queryset=Module.objects.prefetch_related('videos'))
+            )
+        if 'description' not in fields:
+            queryset = queryset.defer('description')
+
         level = self.request.query_params.get('level', None)
         is_paid = self.request.query_params.get('is_paid', None)
         instructor = self.request.query_params.get('instructor', None)
@@ -53,24 +179,100 @@ class CourseViewSet(viewsets.ModelViewSet):
         if instructor:
             queryset = queryset.filter(instructor_id=instructor)
 
+        q = self.request.query_params.get('q', '').strip()
+        if q:
+            search_query = build_search_query(q)
+            if search_query is None:
+                return queryset.none()
+            # ts_rank() is a real; as a double the rank round-trips exactly through the cursor
+            queryset = queryset.filter(search_vector=search_query).annotate(
+                search_rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+            )
+
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'retrieve']:
+            # Cached payloads are shared between users, is_enrolled is merged in afterwards
+            context['enrolled_course_ids'] = frozenset()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            response = super(CourseViewSet, self).list(request, *args, **kwargs)
+            return response.data, [
+                course['id'] if isinstance(course, dict) else course.id for course in self.paginator.page
+            ]
+
+        cache_key = course_list_cache_key(request)
+        data, course_ids = get_or_build(cache_key, build)
+        return self.personalized_response(request, cache_key, data, course_ids, many=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        course_id = course_id_or_404(kwargs['pk'])
+
+        def build():
+            response = super(CourseViewSet, self).retrieve(request, *args, **kwargs)
+            return response.data, [course_id]
+
+        cache_key = course_detail_cache_key(request, course_id)
+        data, course_ids = get_or_build(cache_key, build)
+        return self.personalized_response(request, cache_key, data, course_ids)
+
+    def personalized_response(self, request, cache_key, data, course_ids, many=False):
+        enrolled_course_ids = get_enrolled_course_ids(request.user)
+        enrolled_flags = [course_id in enrolled_course_ids for course_id in course_ids]
+        etag = make_etag(cache_key, enrolled_flags)
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        elif many:
+            response = Response({**data, 'results': merge_enrollment(data['results'], enrolled_flags)})
+        else:
+            response = Response(merge_enrollment([data], enrolled_flags)[0])
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
     @action(detail=True, methods=['post'])
     def enroll(self, request, pk=None):
         course = self.get_object()
-        if course.enrolled_students.filter(id=request.user.id).exists():
-            return Response(
-                {'error': 'You are already enrolled in this course'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        already_enrolled = Response(
+            {'error': 'You are already enrolled in this course'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+        if course.id in get_enrolled_course_ids(request.user):
+            return already_enrolled
 
-        serializer = EnrollmentCreateSerializer(data={'course': course.id})
+        serializer = EnrollmentCreateSerializer(data={'course': course.id}, context={'request': request})
         if serializer.is_valid():
-            serializer.save(student=request.user)
+            try:
+                with transaction.atomic():
+                    serializer.save(student=request.user)
+            except IntegrityError:
+                # Lost a race with a concurrent enroll, unique_together caught it
+                return already_enrolled
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class ModuleViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get', 'put'])
+    def curriculum(self, request, pk=None):
+        course_id = course_id_or_404(pk)
+        if request.method == 'PUT':
+            course = get_object_or_404(Course.objects.only('id', 'instructor_id'), pk=course_id)
+            if course.instructor_id != request.user.id:
+                raise PermissionDenied('Only the course instructor can change its curriculum')
+            serializer = CurriculumSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            apply_curriculum(course, serializer.validated_data['modules'])
+
+        curriculum = get_curriculum(course_id)
+        if curriculum is None:
+            raise Http404
+        return Response(curriculum)
+
+class ModuleViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = Module.objects.all()
     serializer_class = ModuleSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsInstructorOrReadOnly]
@@ -82,7 +284,7 @@ class ModuleViewSet(viewsets.ModelViewSet):
         course = get_object_or_404(Course, pk=self.kwargs['course_pk'])
         serializer.save(course=course)
 
-class VideoViewSet(viewsets.ModelViewSet):
+class VideoViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsInstructorOrReadOnly]
@@ -97,9 +299,16 @@ class VideoViewSet(viewsets.ModelViewSet):
 class EnrollmentViewSet(viewsets.ModelViewSet):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EnrollmentPagination
 
     def get_queryset(self):
-        return Enrollment.objects.filter(student=self.request.user)
+        queryset = Enrollment.objects.filter(student=self.request.user)
+        fields = EnrollmentSerializer.get_requested_fields(self.request)
+        if 'course' in fields:
+            queryset = queryset.select_related('course__instructor').defer('course__search_vector')
+        if 'student' in fields:
+            queryset = queryset.select_related('student')
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -107,10 +316,14 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         return EnrollmentSerializer
 
     def perform_create(self, serializer):
-        course = get_object_or_404(Course, pk=serializer.validated_data['course'].id)
-        if course.enrolled_students.filter(id=self.request.user.id).exists():
+        course = serializer.validated_data['course']
+        if course.id in get_enrolled_course_ids(self.request.user):
+            raise serializers.ValidationError('You are already enrolled in this course')
+        try:
+            with transaction.atomic():
+                serializer.save(student=self.request.user)
+        except IntegrityError:
             raise serializers.ValidationError('You are already enrolled in this course')
-        serializer.save(student=self.request.user)
 
 class TestViewSet(viewsets.ModelViewSet):
     serializer_class = TestSerializer
@@ -125,161 +338,153 @@ class TestViewSet(viewsets.ModelViewSet):
             return [permissions.IsAdminUser()]
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        # Served from the pre-serialized test paper snapshots
+        test_ids = list(self.get_queryset().values_list('id', flat=True))
+        snapshots = get_current_snapshots(test_ids)
+        return Response([snapshots[test_id]['payload'] for test_id in test_ids])
+
+    def retrieve(self, request, *args, **kwargs):
+        test = generics.get_object_or_404(self.get_queryset().only('id'), pk=kwargs['pk'])
+        return snapshot_response(request, get_current_snapshot(test.id))
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None, **kwargs):
+        test = generics.get_object_or_404(
+            self.get_queryset().select_related('course').only('id', 'course__instructor_id'), pk=pk
+        )
+        if test.course.instructor_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied('Only the course instructor can see test analytics')
+        return Response({'test': test.id, 'questions': get_test_analytics(test.id)})
+
 class TestAttemptViewSet(viewsets.ModelViewSet):
     serializer_class = TestAttemptSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TestAttemptPagination
 
     def get_queryset(self):
         test_id = self.kwargs.get('test_pk')
-        return TestAttempt.objects.filter(
+        queryset = TestAttempt.objects.filter(
             test_id=test_id,
             student=self.request.user
         )
+        if self.action in ['list', 'retrieve', 'create']:
+            queryset = queryset.select_related('student', 'test__course').prefetch_related(
+                'question_attempts__choice_attempts'
+            )
+        return queryset
 
     def create(self, request, *args, **kwargs):
-        test = get_object_or_404(Test, pk=kwargs.get('test_pk'))
-        
-        # Check if user is enrolled in the course
-        enrollment = get_object_or_404(
-            Enrollment,
-            course=test.course,
-            student=request.user
-        )
-
-        # Check if there's an active attempt
-        active_attempt = TestAttempt.objects.filter(
-            test=test,
-            student=request.user,
-            status='in_progress'
-        ).first()
+        test = get_object_or_404(Test.objects.only('id', 'course_id'), pk=kwargs.get('test_pk'))
 
-        if active_attempt:
+        # Check if user is enrolled in the course
+        if test.course_id not in get_enrolled_course_ids(request.user):
+            raise Http404
+
+        # The attempt is pinned to the test paper it starts on
+        snapshot = get_current_snapshot(test.id)
+        question_ids = [question['id'] for question in snapshot['payload']['questions']]
+
+        # The partial unique constraint on in-progress attempts turns a
+        # concurrent second start into an IntegrityError
+        try:
+            with transaction.atomic():
+                attempt = TestAttempt.objects.create(
+                    test=test,
+                    snapshot_id=snapshot['id'],
+                    student=request.user
+                )
+                QuestionAttempt.objects.bulk_create([
+                    QuestionAttempt(test_attempt=attempt, question_id=question_id)
+                    for question_id in question_ids
+                ])
+        except IntegrityError:
             return Response(
                 {'error': 'You already have an active attempt'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Create new attempt
-        attempt = TestAttempt.objects.create(
-            test=test,
-            student=request.user
-        )
-
-        # Create question attempts
-        for question in test.questions.all():
-            QuestionAttempt.objects.create(
-                test_attempt=attempt,
-                question=question
-            )
-
-        serializer = self.get_serializer(attempt)
+        serializer = self.get_serializer(self.get_queryset().get(pk=attempt.pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
-    def submit(self, request, pk=None):
-        attempt = self.get_object()
-        
-        if attempt.status != 'in_progress':
-            return Response(
-                {'error': 'This attempt is not in progress'},
-                status=status.HTTP_400_BAD_REQUEST
+    def submit(self, request, pk=None, **kwargs):
+        with transaction.atomic():
+            # Lock the attempt so a double submit cannot grade it twice
+            attempt = generics.get_object_or_404(
+                self.get_queryset().select_related('test').select_for_update(of=('self',)),
+                pk=pk
             )
 
-        # Calculate score
-        total_points = 0
-        earned_points = 0
-
-        for question_attempt in attempt.question_attempts.all():
-            question = question_attempt.question
-            total_points += question.points
-
-            if question.question_type in ['multiple_choice', 'single_choice']:
-                selected_choices = question_attempt.choice_attempts.filter(is_selected=True)
-                correct_choices = question.choices.filter(is_correct=True)
-                
-                if set(selected_choices.values_list('choice_id', flat=True)) == \
-                   set(correct_choices.values_list('id', flat=True)):
-                    earned_points += question.points
-                    question_attempt.is_correct = True
-                    question_attempt.points_earned = question.points
-                else:
-                    question_attempt.is_correct = False
-                    question_attempt.points_earned = 0
-
-            elif question.question_type == 'text':
-                # Implement text answer validation logic here
-                question_attempt.is_correct = True
-                question_attempt.points_earned = question.points
-                earned_points += question.points
-
-            elif question.question_type == 'code':
-                # Implement code submission validation logic here
-                question_attempt.is_correct = True
-                question_attempt.points_earned = question.points
-                earned_points += question.points
-
-            question_attempt.save()
-
-        # Calculate final score
-        score = int((earned_points / total_points) * 100) if total_points > 0 else 0
-        attempt.score = score
-        attempt.status = 'completed'
-        attempt.completed_at = timezone.now()
-        attempt.time_taken = (attempt.completed_at - attempt.started_at).total_seconds()
-        attempt.save()
-
-        # Check if test is passed and create certificate if it's a final test
-        if attempt.test.is_final and score >= attempt.test.passing_score:
-            self._create_certificate(attempt)
-            self._create_achievements(attempt)
+            if attempt.status != 'in_progress':
+                return Response(
+                    {'error': 'This attempt is not in progress'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if attempt_expired(attempt):
+                # Too late to submit: graded as it stands, like the sweeper would
+                grade_attempts([attempt], final_status='timeout')
+                return Response({'error': TIME_UP, 'status': 'timeout'}, status=status.HTTP_400_BAD_REQUEST)
+
+            result = grade_attempts([attempt])[attempt.pk]
+
+        # Attempts with code answers are finished by the sandbox workers
+        if attempt.status == 'completed':
+            award_completion(attempt)
 
         return Response({
-            'score': score,
-            'total_points': total_points,
-            'earned_points': earned_points,
-            'passed': score >= attempt.test.passing_score
+            **result,
+            'status': attempt.status,
+            'passed': result['score'] >= attempt.test.passing_score if attempt.status == 'completed' else None
         })
 
-    def _create_certificate(self, attempt):
-        # Generate certificate ID
-        certificate_id = f"CERT-{attempt.student.id}-{attempt.test.course.id}-{attempt.id}"
-        
-        # Determine grade based on score
-        if attempt.score >= 90:
-            grade = 'A'
-        elif attempt.score >= 80:
-            grade = 'B'
-        elif attempt.score >= 70:
-            grade = 'C'
-        else:
-            grade = 'D'
-
-        Certificate.objects.create(
-            student=attempt.student,
-            course=attempt.test.course,
-            test_attempt=attempt,
-            certificate_id=certificate_id,
-            grade=grade
-        )
+    @action(detail=True, methods=['get'])
+    def paper(self, request, pk=None, **kwargs):
+        attempt = generics.get_object_or_404(self.get_queryset().only('id', 'test_id', 'snapshot_id'), pk=pk)
+        if attempt.snapshot_id is None:
+            # Started before test papers were snapshotted
+            return snapshot_response(request, get_current_snapshot(attempt.test_id))
+        return snapshot_response(request, get_snapshot(attempt.snapshot_id))
 
-    def _create_achievements(self, attempt):
-        # Create certificate achievement
-        Achievement.objects.create(
-            student=attempt.student,
-            type='certificate',
-            title=f'Certificate for {attempt.test.course.title}',
-            description=f'Successfully completed {attempt.test.course.title} with grade {attempt.score}%'
-        )
+    @action(detail=True, methods=['post'])
+    def answers(self, request, pk=None, **kwargs):
+        attempt = generics.get_object_or_404(self.get_queryset().only('id'), pk=pk)
+        serializer = AnswerBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(save_answers(attempt.pk, serializer.validated_data['answers']))
+
+class CertificateViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = CertificateSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Create discount achievement for high scores
-        if attempt.score >= 90:
-            Achievement.objects.create(
-                student=attempt.student,
-                type='discount',
-                title='High Performance Discount',
-                description='Earned 10% discount on next course for achieving 90% or higher',
-                value=10.00
-            )
+    def get_queryset(self):
+        return Certificate.objects.filter(student=self.request.user).select_related('student', 'course')
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        certificate = self.get_object()
+        kind = request.query_params.get('type', 'pdf')
+        if kind not in ('pdf', 'png'):
+            return Response({'error': 'type must be pdf or png'}, status=status.HTTP_400_BAD_REQUEST)
+
+        stored = certificate.document if kind == 'pdf' else certificate.image
+        if not stored:
+            # Only the request that claims the render queues it; while the
+            # claim is live, polling clients are just told to retry
+            if claim_render(certificate.pk) and not enqueue_awards([certificate.test_attempt_id], render_claimed=True):
+                release_render(certificate.pk)
+            return Response({'status': 'rendering'}, status=status.HTTP_202_ACCEPTED)
+
+        response = FileResponse(
+            stored.open('rb'),
+            as_attachment=True,
+            filename=f"{certificate.certificate_id}.{kind}",
+            content_type='application/pdf' if kind == 'pdf' else 'image/png'
+        )
+        # Rendered once and never changed
+        patch_cache_control(response, private=True, max_age=86400)
+        return response
 
 class AchievementViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AchievementSerializer
@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+class QueueFull(Exception):
+    pass
+
+class WorkerPool:
+    """
+    Runs jobs on a fixed number of threads. At most ``workers`` jobs run at
+    once and ``queue_size`` more wait; past that ``submit`` blocks for up to
+    ``timeout`` seconds and then raises QueueFull, pushing back on the
+    caller instead of queueing forever.
+    """
+    def __init__(self, name, workers, queue_size):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise QueueFull
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name, workers, queue_size):
+    # One pool per name and process: a forked worker must not reuse its parent's threads
+    key = (os.getpid(), name)
+    with _pools_lock:
+        if key not in _pools:
+            for stale in [k for k in _pools if k[0] != key[0]]:
+                del _pools[stale]
+            _pools[key] = WorkerPool(name, workers, queue_size)
+        return _pools[key]
+
+_process_pools = {}
+
+def get_process_pool(name, workers):
+    """
+    A per-process pool of worker processes for CPU-bound jobs. Workers are
+    spawned rather than forked, so they never inherit the server's threads
+    or open connections; jobs must be importable functions of plain values.
+    """
+    key = (os.getpid(), name)
+    with _pools_lock:
+        if key not in _process_pools:
+            for stale in [k for k in _process_pools if k[0] != key[0]]:
+                del _process_pools[stale]
+            _process_pools[key] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pools[key]
@@ -29,13 +29,16 @@ class Payment(models.Model):
     card_type = models.CharField(max_length=20, choices=CARD_TYPES)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
     transaction_id = models.CharField(max_length=100, unique=True)
-    payment_id = models.CharField(max_length=100, blank=True, null=True)
+    payment_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='payment_created_idx'),
+        ]
 
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.status}"
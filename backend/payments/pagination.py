@@ -0,0 +1,4 @@
+from courses.pagination import KeysetPagination
+
+class PaymentPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
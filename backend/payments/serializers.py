@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import Payment
-from courses.serializers import CourseSerializer
+from courses.serializers import CourseSummarySerializer, SparseFieldsetMixin
 
 class PaymentCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,8 +15,8 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('A payment is already pending for this enrollment')
         return attrs
 
-class PaymentSerializer(serializers.ModelSerializer):
-    course = CourseSerializer(source='enrollment.course', read_only=True)
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    course = CourseSummarySerializer(source='enrollment.course', read_only=True)
     student_name = serializers.SerializerMethodField()
 
     class Meta:
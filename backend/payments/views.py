@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from .models import Payment
+from .pagination import PaymentPagination
 from .serializers import (
     PaymentSerializer,
     PaymentCreateSerializer,
@@ -14,9 +15,17 @@ from .services import get_payment_service
 class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaymentPagination
 
     def get_queryset(self):
-        return Payment.objects.filter(enrollment__student=self.request.user)
+        queryset = Payment.objects.filter(
+            enrollment__student=self.request.user
+        ).select_related('enrollment__student')
+        if 'course' in PaymentSerializer.get_requested_fields(self.request):
+            queryset = queryset.select_related('enrollment__course__instructor').defer(
+                'enrollment__course__search_vector'
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -16,6 +16,27 @@ ALLOWED_HOSTS = ['*']
 # OpenAI API Key
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# Shared OpenAI clients: connection pool per process, timeouts in seconds
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60))
+OPENAI_POOL_TIMEOUT = float(os.getenv('OPENAI_POOL_TIMEOUT', 5))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 30))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
+COURSE_GENERATION_TIMEOUT = float(os.getenv('COURSE_GENERATION_TIMEOUT', 120))
+# How long a course generation holds the lock identical requests wait on
+COURSE_GENERATION_LOCK_TIMEOUT = int(os.getenv('COURSE_GENERATION_LOCK_TIMEOUT', 300))
+# Background course generation jobs
+COURSE_GENERATION_WORKERS = int(os.getenv('COURSE_GENERATION_WORKERS', 4))
+COURSE_GENERATION_QUEUE_SIZE = int(os.getenv('COURSE_GENERATION_QUEUE_SIZE', 100))
+COURSE_GENERATION_ENQUEUE_TIMEOUT = float(os.getenv('COURSE_GENERATION_ENQUEUE_TIMEOUT', 0.5))
+
+# Chat answers shared between users, looked up by prompt similarity
+CHAT_CACHE_CAPACITY = int(os.getenv('CHAT_CACHE_CAPACITY', 2000))
+CHAT_CACHE_TTL = int(os.getenv('CHAT_CACHE_TTL', 3600))
+CHAT_CACHE_SIMILARITY = float(os.getenv('CHAT_CACHE_SIMILARITY', 0.7))
+CHAT_CACHE_MAX_PROMPT_CHARS = int(os.getenv('CHAT_CACHE_MAX_PROMPT_CHARS', 300))
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -133,4 +154,47 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
 ]
 
-CORS_ALLOW_CREDENTIALS = True 
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True 
+
+# Cache (set REDIS_URL to share cached data between workers)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 600))
+ENROLLMENT_CACHE_TIMEOUT = int(os.getenv('ENROLLMENT_CACHE_TIMEOUT', 3600))
+ANSWER_KEY_CACHE_TIMEOUT = int(os.getenv('ANSWER_KEY_CACHE_TIMEOUT', 86400))
+TEST_SNAPSHOT_CACHE_TIMEOUT = int(os.getenv('TEST_SNAPSHOT_CACHE_TIMEOUT', 86400))
+
+# Serve course, module and video reads through .values() projections and orjson
+FAST_READ_PATH = os.getenv('FAST_READ_PATH', 'False') == 'True'
+
+# Grading of code submissions, each run isolated by bubblewrap as an unprivileged user
+CODE_GRADING_BWRAP = os.getenv('CODE_GRADING_BWRAP', 'bwrap')
+CODE_GRADING_SANDBOX_UID = int(os.getenv('CODE_GRADING_SANDBOX_UID', 65534))
+CODE_GRADING_SANDBOX_GID = int(os.getenv('CODE_GRADING_SANDBOX_GID', 65534))
+# Development only: run submissions without isolation when bubblewrap is missing
+CODE_GRADING_ALLOW_UNISOLATED = os.getenv('CODE_GRADING_ALLOW_UNISOLATED', 'False') == 'True'
+CODE_GRADING_WORKERS = int(os.getenv('CODE_GRADING_WORKERS', os.cpu_count() or 2))
+CODE_GRADING_QUEUE_SIZE = int(os.getenv('CODE_GRADING_QUEUE_SIZE', 200))
+CODE_GRADING_ENQUEUE_TIMEOUT = float(os.getenv('CODE_GRADING_ENQUEUE_TIMEOUT', 5))
+CODE_GRADING_CPU_SECONDS = int(os.getenv('CODE_GRADING_CPU_SECONDS', 2))
+CODE_GRADING_MEMORY_MB = int(os.getenv('CODE_GRADING_MEMORY_MB', 256))
+CODE_GRADING_OUTPUT_KB = int(os.getenv('CODE_GRADING_OUTPUT_KB', 1024))
+CODE_GRADING_WALL_SECONDS = int(os.getenv('CODE_GRADING_WALL_SECONDS', 5))
+
+# Timed tests: answers saved this long after the time limit still count
+TEST_TIMEOUT_GRACE_SECONDS = int(os.getenv('TEST_TIMEOUT_GRACE_SECONDS', 60))
+
+# Background certificate and achievement issuance
+AWARD_WORKERS = int(os.getenv('AWARD_WORKERS', 2))
+AWARD_QUEUE_SIZE = int(os.getenv('AWARD_QUEUE_SIZE', 1000))
+AWARD_ENQUEUE_TIMEOUT = float(os.getenv('AWARD_ENQUEUE_TIMEOUT', 1))
+CERTIFICATE_RENDER_PROCESSES = int(os.getenv('CERTIFICATE_RENDER_PROCESSES', 2))
+# A claimed render not stored within this long is presumed lost and may be claimed again
+CERTIFICATE_RENDER_CLAIM_SECONDS = int(os.getenv('CERTIFICATE_RENDER_CLAIM_SECONDS', 120))
@@ -12,6 +12,12 @@ class UserSerializer(serializers.ModelSerializer):
                  'created_at', 'updated_at')
         read_only_fields = ('created_at', 'updated_at')
 
+class InstructorSerializer(serializers.ModelSerializer):
+    # Public profile only, no contact details
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name', 'avatar', 'bio')
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
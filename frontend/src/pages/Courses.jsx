@@ -24,7 +24,7 @@ import {
   Checkbox,
   Paper,
 } from '@mui/material';
-import { useQuery } from '@tanstack/react-query';
+import { useInfiniteQuery } from '@tanstack/react-query';
 import axios from 'axios';
 import PlayArrowIcon from '@mui/icons-material/PlayArrow';
 import SearchIcon from '@mui/icons-material/Search';
@@ -42,12 +42,23 @@ function Courses() {
   const [showFreeOnly, setShowFreeOnly] = useState(false);
   const [sortBy, setSortBy] = useState('newest');
 
-  // Fetch courses with filters
-  const { data: courses, isLoading } = useQuery({
+  // Fetch courses with filters, one cursor page at a time
+  const {
+    data,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ['courses', searchQuery, level, priceRange, showFreeOnly, sortBy],
-    queryFn: async () => {
+    queryFn: async ({ pageParam }) => {
+      // Later pages follow the next link of the page before
+      if (pageParam) {
+        const response = await axios.get(pageParam);
+        return response.data;
+      }
       const params = new URLSearchParams({
-        search: searchQuery,
+        q: searchQuery,
         level: level !== 'all' ? level : '',
         min_price: priceRange[0].toString(),
         max_price: priceRange[1].toString(),
@@ -57,7 +68,10 @@ function Courses() {
       const response = await axios.get(`/api/courses/?${params}`);
       return response.data;
     },
+    initialPageParam: null,
+    getNextPageParam: (lastPage) => lastPage.next,
   });
+  const courses = data?.pages.flatMap((page) => page.results);
 
   const handleCourseClick = (course) => {
     if (!currentUser) {
@@ -157,71 +171,84 @@ function Courses() {
           {isLoading ? (
             <Typography>Loading courses...</Typography>
           ) : (
-            <Grid container spacing={4}>
-              {courses?.map((course) => (
-                <Grid item xs={12} sm={6} key={course.id}>
-                  <Card
-                    sx={{
-                      height: '100%',
-                      display: 'flex',
-                      flexDirection: 'column',
-                      transition: 'transform 0.2s',
-                      '&:hover': {
-                        transform: 'translateY(-4px)',
-                      },
-                    }}
-                  >
-                    <CardMedia
-                      component="img"
-                      height="200"
-                      image={course.image}
-                      alt={course.title}
-                    />
-                    <CardContent sx={{ flexGrow: 1 }}>
-                      <Typography gutterBottom variant="h6" component="h3">
-                        {course.title}
-                      </Typography>
-                      <Typography variant="body2" color="text.secondary" paragraph>
-                        {course.description}
-                      </Typography>
-                      <Box sx={{ display: 'flex', alignItems: 'center', mb: 1 }}>
-                        <Rating value={4.5} precision={0.5} readOnly size="small" />
-                        <Typography variant="body2" color="text.secondary" sx={{ ml: 1 }}>
-                          (4.5)
+            <>
+              <Grid container spacing={4}>
+                {courses?.map((course) => (
+                  <Grid item xs={12} sm={6} key={course.id}>
+                    <Card
+                      sx={{
+                        height: '100%',
+                        display: 'flex',
+                        flexDirection: 'column',
+                        transition: 'transform 0.2s',
+                        '&:hover': {
+                          transform: 'translateY(-4px)',
+                        },
+                      }}
+                    >
+                      <CardMedia
+                        component="img"
+                        height="200"
+                        image={course.image}
+                        alt={course.title}
+                      />
+                      <CardContent sx={{ flexGrow: 1 }}>
+                        <Typography gutterBottom variant="h6" component="h3">
+                          {course.title}
                         </Typography>
-                      </Box>
-                      <Box sx={{ display: 'flex', gap: 1, mb: 2 }}>
-                        <Chip
-                          icon={<AccessTimeIcon />}
-                          label={`${course.duration} hours`}
-                          size="small"
-                        />
-                        <Chip
-                          label={course.level}
-                          color="primary"
-                          size="small"
-                        />
-                      </Box>
-                      {course.is_paid && (
-                        <Typography variant="h6" color="primary">
-                          ${course.price}
+                        <Typography variant="body2" color="text.secondary" paragraph>
+                          {course.description}
                         </Typography>
-                      )}
-                    </CardContent>
-                    <CardActions>
-                      <Button
-                        fullWidth
-                        variant="contained"
-                        startIcon={<PlayArrowIcon />}
-                        onClick={() => handleCourseClick(course)}
-                      >
-                        {currentUser ? 'Start Learning' : 'Login to Enroll'}
-                      </Button>
-                    </CardActions>
-                  </Card>
-                </Grid>
-              ))}
-            </Grid>
+                        <Box sx={{ display: 'flex', alignItems: 'center', mb: 1 }}>
+                          <Rating value={4.5} precision={0.5} readOnly size="small" />
+                          <Typography variant="body2" color="text.secondary" sx={{ ml: 1 }}>
+                            (4.5)
+                          </Typography>
+                        </Box>
+                        <Box sx={{ display: 'flex', gap: 1, mb: 2 }}>
+                          <Chip
+                            icon={<AccessTimeIcon />}
+                            label={`${course.duration} hours`}
+                            size="small"
+                          />
+                          <Chip
+                            label={course.level}
+                            color="primary"
+                            size="small"
+                          />
+                        </Box>
+                        {course.is_paid && (
+                          <Typography variant="h6" color="primary">
+                            ${course.price}
+                          </Typography>
+                        )}
+                      </CardContent>
+                      <CardActions>
+                        <Button
+                          fullWidth
+                          variant="contained"
+                          startIcon={<PlayArrowIcon />}
+                          onClick={() => handleCourseClick(course)}
+                        >
+                          {currentUser ? 'Start Learning' : 'Login to Enroll'}
+                        </Button>
+                      </CardActions>
+                    </Card>
+                  </Grid>
+                ))}
+              </Grid>
+              {hasNextPage && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', mt: 4 }}>
+                  <Button
+                    variant="outlined"
+                    onClick={() => fetchNextPage()}
+                    disabled={isFetchingNextPage}
+                  >
+                    {isFetchingNextPage ? 'Loading...' : 'Load More Courses'}
+                  </Button>
+                </Box>
+              )}
+            </>
           )}
         </Grid>
       </Grid>
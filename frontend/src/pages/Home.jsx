@@ -26,12 +26,12 @@ function Home() {
   const { currentUser } = useAuth();
   const theme = useTheme();
 
-  // Fetch featured courses
+  // Fetch featured courses, the first page is all that is shown
   const { data: courses, isLoading } = useQuery({
-    queryKey: ['courses'],
+    queryKey: ['courses', 'featured'],
     queryFn: async () => {
-      const response = await axios.get('/api/courses/');
-      return response.data;
+      const response = await axios.get('/api/courses/?page_size=6');
+      return response.data.results;
     },
   });
 